@@ -0,0 +1 @@
+# Composants Streamlit réutilisés par les pages.
@@ -0,0 +1,71 @@
+import streamlit as st
+
+from components.jobs import job_result, start_job
+from engine.export import EXPORT_FORMATS, cached_export, export_bytes, export_key
+from engine.jobs import BACKGROUND_MIN_ROWS
+
+# Libellés des formats proposés au téléchargement
+FORMAT_LABELS = {'json': 'JSON', 'csv': 'CSV', 'parquet': 'Parquet'}
+
+
+# Les versions récentes de Streamlit acceptent une fonction comme données de
+# téléchargement : elle n'est appelée qu'au clic
+def _supports_deferred_download():
+    try:
+        from streamlit.runtime.media_file_manager import MediaFileManager
+    except ImportError:
+        return False
+    return hasattr(MediaFileManager, 'add_deferred')
+
+
+DEFERRED_DOWNLOADS = _supports_deferred_download()
+
+
+# Bouton de téléchargement d'un DataFrame dans un format : l'export n'est
+# sérialisé qu'à la demande, puis gardé en cache pour cette version du DataFrame.
+# Un grand DataFrame est toujours préparé par un premier bouton, en tâche de fond
+# (voir components.jobs) : le téléchargement différé bloquerait la page sans progression.
+def download_button(df, fmt, label, file_name, key, **options):
+    large = len(df) >= BACKGROUND_MIN_ROWS
+    if DEFERRED_DOWNLOADS and not large:
+        st.download_button(
+            label=label,
+            data=lambda: export_bytes(df, fmt, **options),
+            file_name=file_name,
+            mime=EXPORT_FORMATS[fmt],
+            key=key,
+        )
+        return
+
+    # Sinon, un premier bouton prépare le fichier
+    data = cached_export(df, fmt, **options)
+    if data is None:
+        if st.button(f"Préparer : {label}", key=f'{key}_prepare'):
+            start_job(key, ('export',) + export_key(df, fmt, **options),
+                      lambda progress: export_bytes(df, fmt, progress=progress, **options), background=large)
+        data = job_result(key, f"Préparation : {label}",
+                          error_message=f"Erreur lors de la conversion en {FORMAT_LABELS[fmt]}")
+    if data is not None:
+        st.download_button(
+            label=label,
+            data=data,
+            file_name=file_name,
+            mime=EXPORT_FORMATS[fmt],
+            key=key,
+        )
+
+
+# Boutons de téléchargement JSON, CSV et Parquet d'un DataFrame
+def download_buttons(df, file_stem, key, label_suffix='', **options):
+    for fmt, name in FORMAT_LABELS.items():
+        fmt_options = dict(options)
+        if fmt != 'json':
+            fmt_options.pop('indent', None)
+        download_button(
+            df,
+            fmt,
+            label=f"Télécharger en {name}{label_suffix}",
+            file_name=f"{file_stem}.{fmt}",
+            key=f'{key}_{fmt}',
+            **fmt_options,
+        )
@@ -0,0 +1,93 @@
+import time
+
+import streamlit as st
+
+from engine.ingestion import dataset_loaded, load_file
+from engine.jobs import BACKGROUND_MIN_BYTES, CANCELLED, DONE, FAILED, get_runner
+from engine.perf import current_recorder
+
+# Intervalle entre deux réexécutions de la page tant qu'une tâche de fond tourne
+POLL_SECONDS = 0.5
+
+
+# Tâches suivies par la session : nom (emplacement dans la page) -> clé de la tâche
+def _session_jobs():
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+    return st.session_state.jobs
+
+
+# Fonction pour lancer une tâche (voir engine.jobs) et la suivre sous un nom dans la session.
+# func reçoit le rappel progress ; avec background=False, elle est exécutée tout de suite.
+def start_job(name, job_key, func, background=True):
+    get_runner().submit(job_key, func, background)
+    _session_jobs()[name] = job_key
+
+
+# Fonction pour obtenir le résultat de la tâche suivie sous un nom, une fois terminée
+# (None sinon). Tant qu'elle tourne, sa progression et, si elle peut l'être, un bouton
+# pour l'annuler sont affichés ; poll_jobs, en fin de page, réexécute la page jusqu'à ce qu'elle se termine.
+def job_result(name, label, error_message=None):
+    job_key = _session_jobs().get(name)
+    job = get_runner().get(job_key) if job_key is not None else None
+    if job is None:
+        _session_jobs().pop(name, None)
+        return None
+    if job.finished:
+        del _session_jobs()[name]
+        recorder = current_recorder()
+        if recorder is not None and job.perf is not None:
+            recorder.extend(job.perf)
+        if job.status == FAILED:
+            if error_message:
+                st.error(f"{error_message}: {job.error}")
+            else:
+                st.error(str(job.error) if isinstance(job.error, ValueError) else f"Erreur : {job.error}")
+        elif job.status == CANCELLED:
+            st.info(f"{label} : annulé.")
+        return job.result if job.status == DONE else None
+
+    if job.total is not None:
+        text = f"{label} ({job.done}/{job.total})"
+    elif job.done:
+        # Quantité de travail inconnue (lecture par morceaux) : nombre de lignes lues
+        text = f"{label} ({job.done} lignes lues)"
+    else:
+        text = f"{label}..."
+    st.progress(job.fraction or 0.0, text=text)
+    # Seules les tâches qui suivent leur avancement s'arrêtent à la demande
+    if job.cancellable and st.button('Annuler', key=f'{name}_cancel'):
+        job.cancel()
+    return None
+
+
+# Fonction à appeler en fin de page : tant qu'une tâche suivie tourne, la page est
+# réexécutée régulièrement pour afficher sa progression, puis son résultat
+def poll_jobs():
+    runner = get_runner()
+    for job_key in _session_jobs().values():
+        job = runner.get(job_key)
+        if job is not None and not job.finished:
+            time.sleep(POLL_SECONDS)
+            st.rerun()
+
+
+# Fonction pour charger un fichier : un fichier volumineux pas encore chargé est lu en
+# tâche de fond, la page restant utilisable pendant la lecture
+def load_dataset(file, key, name, **options):
+    job_key = ('load', key)
+    if _session_jobs().get(name) != job_key:
+        if dataset_loaded(key) or getattr(file, 'size', 0) < BACKGROUND_MIN_BYTES:
+            _session_jobs().pop(name, None)
+            return load_file(file, **options)
+        job = get_runner().get(job_key)
+        if job is not None and job.status == CANCELLED:
+            st.info("Chargement annulé.")
+            if not st.button('Relancer le chargement', key=f'{name}_restart'):
+                return None
+        start_job(name, job_key, lambda progress: load_file(file, progress=progress, **options) is not None)
+    # La tâche ne renvoie pas le DataFrame, gardé par le cache d'ingestion et le magasin :
+    # une tâche terminée, gardée par l'exécuteur, ne le retient pas en mémoire
+    if job_result(name, 'Chargement du fichier'):
+        return load_file(file, **options)
+    return None
@@ -0,0 +1,14 @@
+import streamlit as st
+
+from engine.ingestion import dataset_memory_report
+
+
+# Rapport de la mémoire occupée par chaque colonne, avant et après optimisation des types
+def show_memory_report(key):
+    report = dataset_memory_report(key)
+    if report is None:
+        return
+    before = report['Mémoire avant (Mo)'].sum()
+    after = report['Mémoire après (Mo)'].sum()
+    with st.expander(f"Mémoire : {before:.1f} Mo → {after:.1f} Mo", expanded=False):
+        st.dataframe(report, hide_index=True)
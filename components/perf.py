@@ -0,0 +1,15 @@
+import streamlit as st
+
+from engine.perf import PERF_ENABLED, perf_table
+
+
+# Panneau "Perf" : durée et mémoire de chaque étape du rerun en cours
+# (et des tâches de fond terminées pendant ce rerun)
+def perf_panel(recorder):
+    if not PERF_ENABLED or recorder is None:
+        return
+    with st.expander(f"Perf : {recorder.elapsed * 1000:.0f} ms", expanded=False):
+        if recorder.records:
+            st.dataframe(perf_table(recorder), hide_index=True)
+        else:
+            st.caption("Aucune étape mesurée pendant ce rerun.")
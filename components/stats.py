@@ -0,0 +1,30 @@
+import streamlit as st
+
+
+# Formatage des valeurs pour les indications (les flottants sont arrondis)
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:.6g}'
+    return str(value)
+
+
+# Indications sur la colonne choisie dans la recherche avancée : étendue des valeurs,
+# valeurs manquantes, nombre de valeurs distinctes et valeurs les plus fréquentes
+def show_column_hints(stats):
+    parts = []
+    if stats['min'] is not None:
+        parts.append(f"de {_format(stats['min'])} à {_format(stats['max'])}")
+    distinct = stats['distinct'] if stats['distinct_exact'] else f"~{stats['distinct']}"
+    parts.append(f"{distinct} valeurs distinctes")
+    if stats['nulls']:
+        parts.append(f"{stats['nulls']} manquantes")
+    # Valeurs toutes uniques : aucune n'est plus fréquente que les autres
+    if stats['top'] and stats['top'][0][1] > 1:
+        parts.append('fréquentes : ' + ', '.join(_format(value) for value, _ in stats['top'][:5]))
+    st.caption('Valeurs : ' + ' · '.join(parts))
+
+
+# Profil du dataset : statistiques de toutes les colonnes, calculées à la demande
+def show_profile(stats, key):
+    if st.checkbox("Afficher le profil du dataset", key=key):
+        st.dataframe(stats.summary(), hide_index=True)
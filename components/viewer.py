@@ -0,0 +1,58 @@
+import math
+
+import streamlit as st
+
+from engine.perf import stage
+
+# Tailles de page proposées
+PAGE_SIZES = [25, 50, 100, 500, 1000]
+
+NO_SORT = '(aucun)'
+
+
+# Fonction pour obtenir l'ordre de tri des lignes, calculé une fois par (DataFrame, colonne, sens)
+def _sort_order(df, key, column, ascending):
+    state_key = f'{key}_sort_order'
+    cached = st.session_state.get(state_key)
+    signature = (id(df), len(df), column, ascending)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    series = df[column].reset_index(drop=True)
+    order = series.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    st.session_state[state_key] = (signature, order)
+    return order
+
+
+# Affichage d'un DataFrame par pages : seules les lignes visibles sont envoyées au navigateur.
+# Le tri et le découpage sont faits côté serveur.
+def show_dataframe(df, key):
+    total_rows, total_columns = df.shape
+
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox('Trier par', [NO_SORT] + list(df.columns), key=f'{key}_sort')
+    with col2:
+        ascending = st.selectbox('Ordre', ['Croissant', 'Décroissant'], key=f'{key}_order') == 'Croissant'
+    with col3:
+        page_size = st.selectbox('Lignes par page', PAGE_SIZES, key=f'{key}_page_size')
+    page_count = max(math.ceil(total_rows / page_size), 1)
+    page_key = f'{key}_page'
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = 1
+    with col4:
+        page = st.number_input('Page', min_value=1, max_value=page_count, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    end = min(start + page_size, total_rows)
+    # Le tri et l'envoi de la page au navigateur sont mesurés (voir engine.perf)
+    with stage('render', key=key, rows=end - start):
+        if sort_column != NO_SORT and sort_column in df.columns:
+            window = df.take(_sort_order(df, key, sort_column, ascending)[start:end])
+        else:
+            window = df.iloc[start:end]
+
+        st.dataframe(window)
+    if total_rows:
+        st.caption(f"Lignes {start + 1} à {end} sur {total_rows} — {total_columns} colonnes — page {page}/{page_count}")
+    else:
+        st.caption(f"Aucune ligne — {total_columns} colonnes")
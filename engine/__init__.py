@@ -0,0 +1,2 @@
+# Moteur de traitement des datasets, partagé par les pages Streamlit.
+# Aucun module de ce paquet n'importe streamlit.
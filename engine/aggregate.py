@@ -0,0 +1,82 @@
+import pandas as pd
+
+from engine.perf import stage
+
+# Fonctions d'agrégation proposées, avec leur libellé
+AGGREGATIONS = {
+    'count': 'Nombre',
+    'sum': 'Somme',
+    'mean': 'Moyenne',
+    'min': 'Minimum',
+    'max': 'Maximum',
+    'quantile': 'Quantile',
+}
+
+# Fonctions qui demandent une colonne numérique
+NUMERIC_AGGREGATIONS = ('sum', 'mean', 'quantile')
+
+# Colonne du résultat donnant le nombre de lignes de chaque groupe
+ROWS_COLUMN = 'Lignes'
+
+
+# Fonction pour vérifier une demande d'agrégation avant de la lancer.
+# aggregations : liste de (colonne, fonction)
+def check_aggregation(df, group_by, aggregations, quantile=0.5):
+    if not group_by:
+        raise ValueError("Choisissez au moins une colonne de regroupement.")
+    for column_name in group_by:
+        if column_name not in df.columns:
+            raise ValueError(f"Colonne inconnue : {column_name}")
+    for column_name, func in aggregations:
+        if column_name not in df.columns:
+            raise ValueError(f"Colonne inconnue : {column_name}")
+        if func not in AGGREGATIONS:
+            raise ValueError(f"Fonction d'agrégation inconnue : {func}")
+        dtype = df[column_name].dtype
+        # Somme et moyenne d'une colonne booléenne : nombre et proportion de vrais
+        numeric = pd.api.types.is_numeric_dtype(dtype) and not (func == 'quantile' and pd.api.types.is_bool_dtype(dtype))
+        if func in NUMERIC_AGGREGATIONS and not numeric:
+            raise ValueError(f"{AGGREGATIONS[func]} : la colonne '{column_name}' n'est pas numérique")
+    if not 0 <= quantile <= 1:
+        raise ValueError("Le quantile doit être compris entre 0 et 1.")
+
+
+# Fonction pour obtenir la clé d'une agrégation du résultat source_key (dataset ou
+# résultat de filtres, voir engine.filters.result_key). L'ordre des agrégations est
+# gardé : il donne l'ordre des colonnes du résultat.
+def aggregation_key(source_key, group_by, aggregations, quantile=0.5):
+    uses_quantile = any(func == 'quantile' for _, func in aggregations)
+    return (f"{source_key}|groupby:{list(group_by)}|agg:{[tuple(a) for a in aggregations]}"
+            + (f"|q:{quantile}" if uses_quantile else ''))
+
+
+# Nom de la colonne du résultat pour une fonction appliquée à une colonne
+def _result_column(column_name, func, quantile):
+    if func == 'quantile':
+        return f'{column_name} (quantile {quantile:g})'
+    return f'{column_name} ({func})'
+
+
+# Fonction pour regrouper un DataFrame et agréger des colonnes. Les groupes sont
+# calculés une seule fois (hachage des clés) puis chaque agrégation est vectorisée.
+# Le résultat a une ligne par groupe : les colonnes de regroupement, le nombre de
+# lignes du groupe puis une colonne par (colonne, fonction).
+def aggregate(df, group_by, aggregations, quantile=0.5):
+    check_aggregation(df, group_by, aggregations, quantile)
+    with stage('aggregate', rows=len(df), group_by=len(group_by), aggregations=len(aggregations)) as details:
+        grouped = df.groupby(list(group_by), sort=True, observed=True, dropna=False)
+        columns = {ROWS_COLUMN: grouped.size()}
+        for column_name, func in aggregations:
+            name = _result_column(column_name, func, quantile)
+            if name in columns:
+                continue
+            try:
+                if func == 'quantile':
+                    columns[name] = grouped[column_name].quantile(quantile)
+                else:
+                    columns[name] = grouped[column_name].agg(func)
+            except TypeError:
+                raise ValueError(f"{AGGREGATIONS[func]} : valeurs non comparables dans la colonne '{column_name}'")
+        result = pd.DataFrame(columns).reset_index()
+        details['groups'] = len(result)
+    return result
@@ -0,0 +1,322 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from engine.filters import CONDITIONS, convert_value, filter_indices
+from engine.perf import timed
+from engine.search import is_regex
+
+# Nombre de fils utilisés pour parcourir les fichiers (tous les cœurs par défaut)
+QUERY_THREADS = int(os.environ.get('DATASET_APP_QUERY_THREADS', os.cpu_count() or 1))
+
+# Colonne calculée pendant le parcours : vrai pour les lignes retenues
+MATCH_COLUMN = '__match__'
+
+# Colonne ajoutée à la table Arrow interrogée par DuckDB : position de chaque ligne
+POSITION_COLUMN = '__position__'
+
+# Libellés des moteurs de requête proposés dans les pages
+BACKEND_LABELS = {'pandas': 'pandas (en mémoire)', 'arrow': 'Arrow (fichier sur disque)', 'duckdb': 'DuckDB'}
+
+
+# Levée quand un moteur ne sait pas évaluer des filtres : le moteur de secours prend le relais
+class UnsupportedQuery(Exception):
+    pass
+
+
+# Fonction pour vérifier que les colonnes et conditions des filtres existent
+def check_filters(columns, filters):
+    for column_name, condition, _ in filters:
+        if column_name not in columns:
+            raise ValueError(f"Colonne inconnue : {column_name}")
+        if condition not in CONDITIONS:
+            raise ValueError(f"Condition inconnue : {condition}")
+
+
+# Fonction pour convertir la valeur d'un filtre au type Arrow d'une colonne.
+# Seuls les nombres et le texte sont évalués hors de pandas ; les autres types
+# (booléens, dates...) gardent la sémantique de pandas via le moteur de secours.
+def typed_value(arrow_type, value):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        return convert_value(value, arrow_type.to_pandas_dtype())
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return value
+    raise UnsupportedQuery(f"Type non pris en charge : {arrow_type}")
+
+
+# Fonction pour traduire une liste de filtres en expression Arrow
+def arrow_expression(schema, filters):
+    expression = None
+    for column_name, condition, value in filters:
+        arrow_type = schema.field(column_name).type
+        field = pc.field(column_name)
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+            field = field.cast(arrow_type)
+        if condition == 'contains':
+            if not (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+                raise UnsupportedQuery("'contains' sur une colonne non textuelle")
+            term = pc.match_substring_regex(field, value) if is_regex(value) else pc.match_substring(field, value)
+        elif condition == 'equals':
+            term = field == typed_value(arrow_type, value)
+        elif condition == 'greater_than':
+            term = field > typed_value(arrow_type, value)
+        elif condition == 'less_than':
+            term = field < typed_value(arrow_type, value)
+        else:
+            min_value, max_value = value
+            term = (field >= typed_value(arrow_type, min_value)) & (field <= typed_value(arrow_type, max_value))
+        expression = term if expression is None else expression & term
+    return expression
+
+
+# Moteur pandas : le DataFrame en mémoire, avec le cache de filtres, les index et la
+# recherche texte existants. Il sait tout évaluer et sert de moteur de secours.
+class PandasBackend:
+    name = 'pandas'
+
+    def __init__(self, df, indexes=None, text=None, cache=None):
+        self.df = df
+        self.indexes = indexes
+        self.text = text
+        self.cache = cache
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    # progress(fait, total) suit l'avancement des grands filtrages (voir engine.parallel)
+    def filter_positions(self, filters, progress=None):
+        check_filters(self.df.columns, filters)
+        if self.cache is not None:
+            return self.cache.filter_indices(self.df, filters, self.indexes, self.text, progress)
+        return filter_indices(self.df, filters, self.indexes, self.text, progress)
+
+    @timed('pandas_query')
+    def query(self, filters, columns=None, progress=None):
+        df = self.df if columns is None else self.df[list(columns)]
+        if not filters:
+            return df.copy(deep=False)
+        return df.take(self.filter_positions(filters, progress))
+
+
+# Moteur Arrow : les filtres sont évalués directement sur un fichier Arrow IPC ou
+# Parquet. Seules les colonnes des filtres sont lues (projection) ; pour Parquet,
+# les groupes de lignes dont les statistiques excluent le filtre ne sont pas lus.
+# Les morceaux du fichier sont traités en parallèle par Arrow, sur tous les cœurs.
+class ArrowBackend:
+    name = 'arrow'
+
+    def __init__(self, path, file_format='ipc', fallback=None, threads=QUERY_THREADS):
+        self.path = path
+        self.file_format = file_format
+        self.fallback = fallback
+        self.threads = threads
+        self._dataset = None
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            self._dataset = ds.dataset(self.path, format=self.file_format)
+        return self._dataset
+
+    @property
+    def columns(self):
+        return [name for name in self.dataset.schema.names if name not in self._index_columns()]
+
+    def _index_columns(self):
+        metadata = self.dataset.schema.pandas_metadata or {}
+        return [col for col in metadata.get('index_columns', []) if isinstance(col, str)]
+
+    # Fragments à parcourir : pour Parquet, seulement les groupes de lignes dont les
+    # statistiques n'excluent pas le filtre, avec la position de leur première ligne
+    def _scanned(self, expression):
+        if self.file_format != 'parquet':
+            return self.dataset, None, None
+        fragment = next(iter(self.dataset.get_fragments()))
+        metadata = fragment.metadata
+        starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        kept = fragment.split_by_row_group(filter=expression, schema=self.dataset.schema)
+        ids = np.array([row_group.row_groups[0].id for row_group in kept], dtype=np.int64)
+        dataset = ds.FileSystemDataset(kept, self.dataset.schema, self.dataset.format, fragment.filesystem)
+        return dataset, starts[ids], (starts[ids + 1] - starts[ids]) if len(ids) else ids
+
+    # Positions des lignes qui vérifient l'expression : le masque est calculé par le
+    # parcours Arrow lui-même (morceaux en parallèle, ordre des lignes conservé)
+    def _matching_positions(self, expression):
+        dataset, starts, lengths = self._scanned(expression)
+        if starts is not None and not len(starts):
+            return np.array([], dtype=np.int64)
+        scanner = dataset.scanner(columns={MATCH_COLUMN: expression}, use_threads=self.threads > 1)
+        mask = pc.fill_null(scanner.to_table().column(MATCH_COLUMN), False)
+        hits = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+        if starts is None:
+            return hits
+        # Positions dans les groupes lus -> positions dans le fichier
+        offsets = np.cumsum(np.concatenate([[0], lengths]))
+        group = np.searchsorted(offsets, hits, side='right') - 1
+        return starts[group] + hits - offsets[group]
+
+    def filter_positions(self, filters, progress=None):
+        check_filters(self.columns, filters)
+        if not filters:
+            return np.arange(self.dataset.count_rows())
+        try:
+            return self._matching_positions(arrow_expression(self.dataset.schema, filters))
+        except (UnsupportedQuery, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            if self.fallback is None:
+                raise
+            return self.fallback.filter_positions(filters, progress)
+
+    # Lignes aux positions données, avec seulement les colonnes demandées et l'index d'origine
+    def take(self, positions, columns=None):
+        columns = self.columns if columns is None else list(columns)
+        index_columns = self._index_columns()
+        table = self.dataset.take(pa.array(positions, type=pa.int64()), columns=columns + index_columns)
+        df = table.to_pandas(split_blocks=True)
+        if not index_columns:
+            # Index entier par défaut : les étiquettes se déduisent des positions
+            metadata = self.dataset.schema.pandas_metadata or {}
+            ranges = [col for col in metadata.get('index_columns', []) if isinstance(col, dict)]
+            start, step = (ranges[0]['start'], ranges[0]['step']) if ranges else (0, 1)
+            df.index = pd.Index(start + np.asarray(positions, dtype=np.int64) * step)
+        return df
+
+    @timed('arrow_query')
+    def query(self, filters, columns=None, progress=None):
+        positions = self.filter_positions(filters, progress)
+        if self.fallback is not None and isinstance(self.fallback, PandasBackend):
+            # Le DataFrame est déjà projeté en mémoire : inutile de relire le fichier
+            df = self.fallback.df if columns is None else self.fallback.df[list(columns)]
+            return df.take(positions)
+        return self.take(positions, columns)
+
+
+# Fonction pour savoir si DuckDB est installé (dépendance optionnelle)
+def duckdb_available():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Fonction pour citer un nom de colonne dans une requête SQL
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Moteur DuckDB (optionnel) : les filtres sont traduits en SQL et exécutés sur tous
+# les cœurs. Un fichier Parquet est lu par DuckDB, avec projection et filtres poussés
+# dans la lecture ; un fichier Arrow IPC du magasin est projeté en mémoire et parcouru
+# sans copie, avec une colonne de positions ajoutée.
+class DuckDBBackend:
+    name = 'duckdb'
+
+    def __init__(self, path, file_format='parquet', fallback=None, threads=QUERY_THREADS):
+        import duckdb
+        self.path = path
+        self.file_format = file_format
+        self.fallback = fallback
+        self._connection = duckdb.connect()
+        self._connection.execute(f"SET threads TO {int(threads)}")
+        self._arrow = ArrowBackend(path, file_format, threads=threads)
+        self._registered = False
+
+    # Requête renvoyant les positions des lignes qui vérifient la condition where
+    def _positions_query(self, where):
+        if self.file_format == 'parquet':
+            return f"SELECT file_row_number FROM read_parquet(?, file_row_number = true) WHERE {where} ORDER BY 1", [self.path]
+        if not self._registered:
+            with pa.memory_map(self.path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            table = table.append_column(POSITION_COLUMN, pa.array(np.arange(table.num_rows, dtype=np.int64)))
+            self._connection.register('dataset', table)
+            self._registered = True
+        return f"SELECT {_quote(POSITION_COLUMN)} FROM dataset WHERE {where} ORDER BY 1", []
+
+    @property
+    def columns(self):
+        return self._arrow.columns
+
+    def _where(self, filters):
+        schema = self._arrow.dataset.schema
+        clauses, params = [], []
+        for column_name, condition, value in filters:
+            arrow_type = schema.field(column_name).type
+            if pa.types.is_dictionary(arrow_type):
+                arrow_type = arrow_type.value_type
+            column = _quote(column_name)
+            if condition == 'contains':
+                if not (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+                    raise UnsupportedQuery("'contains' sur une colonne non textuelle")
+                if is_regex(value):
+                    clauses.append(f"regexp_matches({column}, ?)")
+                    params.append(value)
+                else:
+                    clauses.append(f"contains({column}, ?)")
+                    params.append(value)
+            elif condition == 'equals':
+                clauses.append(f"{column} = ?")
+                params.append(typed_value(arrow_type, value))
+            elif condition == 'greater_than':
+                clauses.append(f"{column} > ?")
+                params.append(typed_value(arrow_type, value))
+            elif condition == 'less_than':
+                clauses.append(f"{column} < ?")
+                params.append(typed_value(arrow_type, value))
+            else:
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend(typed_value(arrow_type, v) for v in value)
+        return ' AND '.join(clauses), params
+
+    def filter_positions(self, filters, progress=None):
+        check_filters(self.columns, filters)
+        if not filters:
+            return np.arange(self._arrow.dataset.count_rows())
+        try:
+            where, params = self._where(filters)
+            sql, source_params = self._positions_query(where)
+            result = self._connection.execute(sql, source_params + params).fetch_arrow_table()
+        except UnsupportedQuery:
+            if self.fallback is None:
+                raise
+            return self.fallback.filter_positions(filters, progress)
+        return result.column(0).to_numpy().astype(np.int64, copy=False)
+
+    @timed('duckdb_query')
+    def query(self, filters, columns=None, progress=None):
+        positions = self.filter_positions(filters, progress)
+        if isinstance(self.fallback, PandasBackend):
+            df = self.fallback.df if columns is None else self.fallback.df[list(columns)]
+            return df.take(positions)
+        return self._arrow.take(positions, columns)
+
+
+# Fonction pour lister les moteurs utilisables pour une source (format du fichier sur disque)
+def available_backends(source_format=None):
+    names = ['pandas']
+    if source_format in ('ipc', 'parquet'):
+        names.append('arrow')
+    if source_format in ('ipc', 'parquet') and duckdb_available():
+        names.append('duckdb')
+    return names
+
+
+# Fonction pour créer un moteur de requête. Le moteur pandas sur df sert toujours
+# de secours pour les filtres que les autres moteurs ne savent pas évaluer.
+def backend_for(name, df=None, source=None, source_format=None, indexes=None, text=None, cache=None):
+    fallback = PandasBackend(df, indexes, text, cache) if df is not None else None
+    if name == 'arrow' and source is not None:
+        return ArrowBackend(source, source_format, fallback=fallback)
+    if name == 'duckdb' and source is not None and source_format in ('ipc', 'parquet') and duckdb_available():
+        return DuckDBBackend(source, source_format, fallback=fallback)
+    if fallback is None:
+        raise ValueError(f"Moteur de requête indisponible : {name}")
+    return fallback
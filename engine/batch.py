@@ -0,0 +1,228 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from engine.backends import check_filters
+from engine.editlog import COLUMN_DEFAULTS, ensure_signature_at_end
+from engine.export import CHUNK_ROWS, EXPORT_FORMATS, PARQUET_COMPRESSIONS, StreamingExport
+from engine.filters import apply_filters
+from engine.ingestion import SUPPORTED_FORMATS
+from engine.patches import read_patch_file, scatter_column
+from engine.streaming import iter_batches, table_to_frame
+
+# Clés acceptées dans un fichier de traitement
+SPEC_KEYS = {'modifications', 'filters', 'columns', 'format', 'indent', 'compression', 'chunk_rows'}
+
+# Droits d'un fichier créé normalement (un fichier temporaire est créé en 0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Opérations de modification acceptées, avec leurs champs obligatoires
+OPERATIONS = {
+    'set': ('row', 'column', 'value'),
+    'patch_file': ('path',),
+    'add_column': ('name', 'type'),
+    'delete_column': ('name',),
+    'delete_rows': ('rows',),
+    'signature': ('author',),
+}
+
+
+# Fonction pour déterminer le format d'un fichier à partir de son chemin
+def path_format(path):
+    extension = os.path.splitext(str(path))[1].lower().lstrip('.')
+    return extension if extension in SUPPORTED_FORMATS else None
+
+
+# Fonction pour lire un fichier de traitement JSON ou YAML (YAML seulement si PyYAML
+# est installé). Les chemins relatifs du fichier (fichiers de modifications) sont
+# résolus par rapport à son dossier.
+def load_spec(path):
+    with open(path, encoding='utf-8') as f:
+        if str(path).lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("PyYAML n'est pas installé : utilisez un fichier de traitement JSON")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    spec = check_spec(spec or {})
+    base = os.path.dirname(os.path.abspath(path))
+    for op in spec['modifications']:
+        if op['op'] == 'patch_file' and not os.path.isabs(op['path']):
+            op['path'] = os.path.join(base, op['path'])
+    return spec
+
+
+# Fonction pour vérifier un traitement et le compléter avec les valeurs par défaut.
+# Les filtres s'écrivent [colonne, condition, valeur] ou {"column", "condition", "value"}.
+def check_spec(spec):
+    if not isinstance(spec, dict):
+        raise ValueError("Le fichier de traitement doit contenir un objet")
+    unknown = sorted(set(spec) - SPEC_KEYS)
+    if unknown:
+        raise ValueError(f"Clés inconnues dans le fichier de traitement : {', '.join(unknown)}")
+    spec = dict(spec)
+
+    filters = []
+    for f in spec.get('filters') or []:
+        if isinstance(f, dict):
+            f = (f.get('column'), f.get('condition'), f.get('value'))
+        if not isinstance(f, (list, tuple)) or len(f) != 3:
+            raise ValueError(f"Filtre invalide : {f}")
+        column_name, condition, value = f
+        if condition == 'between' and (not isinstance(value, (list, tuple)) or len(value) != 2):
+            raise ValueError(f"Le filtre 'between' sur '{column_name}' demande deux valeurs")
+        filters.append((column_name, condition, tuple(value) if condition == 'between' else value))
+    spec['filters'] = filters
+
+    modifications = []
+    for op in spec.get('modifications') or []:
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind not in OPERATIONS:
+            raise ValueError(f"Modification inconnue : {op}")
+        missing = [field for field in OPERATIONS[kind] if field not in op]
+        if missing:
+            raise ValueError(f"Modification '{kind}' incomplète : {', '.join(missing)} manquant(s)")
+        if kind == 'add_column' and op['type'] not in COLUMN_DEFAULTS:
+            raise ValueError(f"Type de colonne inconnu : {op['type']}")
+        modifications.append(dict(op))
+    spec['modifications'] = modifications
+
+    if spec.get('format') is not None and spec['format'] not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {spec['format']}")
+    if spec.get('compression', 'snappy') not in PARQUET_COMPRESSIONS:
+        raise ValueError(f"Compression inconnue : {spec['compression']}")
+    spec.setdefault('format', None)
+    spec.setdefault('compression', 'snappy')
+    spec.setdefault('indent', None)
+    spec['chunk_rows'] = int(spec.get('chunk_rows') or CHUNK_ROWS)
+    spec.setdefault('columns', None)
+    return spec
+
+
+# Modifications préparées pour être appliquées morceau par morceau : les numéros de
+# ligne sont ceux du fichier d'entrée (à partir de 0), avant toute suppression
+class _Modifications:
+    def __init__(self, modifications):
+        self.steps = []
+        self.signature = None
+        deleted = []
+        for op in modifications:
+            kind = op['op']
+            if kind == 'set':
+                self._add_cells([(int(op['row']), op['column'], op['value'])])
+            elif kind == 'patch_file':
+                with open(op['path'], 'rb') as f:
+                    self._add_cells(read_patch_file(f))
+            elif kind == 'delete_rows':
+                deleted.extend(int(row) for row in op['rows'])
+            elif kind == 'signature':
+                # Comme dans la page de modification : écrite dans la première ligne du résultat
+                self.signature = f"Modifié par {op['author']} le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                self.steps.append(('add_column', 'Signature', None))
+            else:
+                self.steps.append((kind, op['name'], op.get('type')))
+        self.deleted = np.unique(np.asarray(deleted, dtype=np.int64))
+
+    # Les cellules consécutives forment une seule étape, triée par ligne (tri stable :
+    # pour une même cellule, la dernière modification l'emporte)
+    def _add_cells(self, cells):
+        if self.steps and self.steps[-1][0] == 'set':
+            cells = self.steps.pop()[1] + cells
+        cells = sorted(cells, key=lambda cell: cell[0])
+        rows = np.fromiter((cell[0] for cell in cells), dtype=np.int64, count=len(cells))
+        self.steps.append(('set', cells, rows))
+
+    # Appliquer les modifications à un morceau commençant à la ligne offset du fichier
+    def apply(self, chunk, offset):
+        end = offset + len(chunk)
+        for kind, target, extra in self.steps:
+            if kind == 'add_column':
+                chunk[target] = COLUMN_DEFAULTS.get(extra)
+            elif kind == 'delete_column':
+                chunk = chunk.drop(columns=[target], errors='ignore')
+            else:
+                # Cellules de ce morceau : une recherche dichotomique dans les lignes triées
+                lo, hi = np.searchsorted(extra, [offset, end])
+                by_column = {}
+                for row, column_name, value in target[lo:hi]:
+                    positions, values = by_column.setdefault(column_name, ([], []))
+                    positions.append(row - offset)
+                    values.append(value)
+                for column_name, (positions, values) in by_column.items():
+                    if column_name not in chunk.columns:
+                        raise ValueError(f"Colonne inconnue dans les modifications : {column_name}")
+                    chunk[column_name] = scatter_column(chunk[column_name], positions, values)
+        if len(self.deleted):
+            lo, hi = np.searchsorted(self.deleted, [offset, end])
+            if hi > lo:
+                keep = np.ones(len(chunk), dtype=bool)
+                keep[self.deleted[lo:hi] - offset] = False
+                chunk = chunk[keep]
+        return ensure_signature_at_end(chunk)
+
+
+# Fonction pour traiter un fichier sans le charger en entier : lecture par morceaux,
+# modifications, filtres, choix des colonnes, puis écriture du morceau dans le fichier
+# de sortie. Renvoie un résumé (lignes lues et écrites, durée).
+def process_file(input_path, output_path, spec):
+    spec = check_spec(spec)
+    started = time.perf_counter()
+    in_format = path_format(input_path)
+    if in_format is None:
+        raise ValueError(f"Format de fichier non pris en charge : {input_path}")
+    out_format = spec['format'] or path_format(output_path)
+    if out_format is None:
+        raise ValueError(f"Format de sortie inconnu : {output_path}")
+    modifications = _Modifications(spec['modifications'])
+
+    rows_read = chunks = 0
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    # Fichier temporaire unique dans le dossier de sortie, renommé une fois complet
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(output_path)}.', suffix='.tmp')
+    try:
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        # Flux relisible : un export Parquet peut devoir réécrire les groupes déjà écrits
+        with os.fdopen(fd, 'w+b') as out, StreamingExport(out_format, out, spec['indent'], spec['compression']) as writer:
+            for batch in iter_batches(input_path, in_format, spec['chunk_rows']):
+                chunk = table_to_frame(pa.Table.from_batches([batch]))
+                offset = rows_read
+                rows_read += len(chunk)
+                chunk = modifications.apply(chunk, offset)
+                if spec['filters']:
+                    check_filters(chunk.columns, spec['filters'])
+                    chunk = apply_filters(chunk, spec['filters'])
+                if spec['columns'] is not None:
+                    missing = [col for col in spec['columns'] if col not in chunk.columns]
+                    if missing:
+                        raise ValueError(f"Colonnes inconnues : {', '.join(missing)}")
+                    chunk = chunk[list(spec['columns'])]
+                chunk = chunk.reset_index(drop=True)
+                if modifications.signature is not None and 'Signature' in chunk.columns and len(chunk):
+                    chunk['Signature'] = scatter_column(chunk['Signature'], [0], [modifications.signature])
+                    modifications.signature = None
+                writer.write(chunk)
+                chunks += 1
+            if not chunks:
+                # Fichier d'entrée vide : la sortie reste un fichier valide
+                writer.write(pd.DataFrame(columns=spec['columns'] or []))
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {
+        'input': str(input_path),
+        'output': str(output_path),
+        'rows_read': rows_read,
+        'rows_written': writer.rows,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
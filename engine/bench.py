@@ -0,0 +1,331 @@
+import os
+
+# Le benchmark mesure la lecture des fichiers : sauf demande contraire, le magasin partagé
+# (voir engine.store) est désactivé avant l'import du moteur, pour que chaque chargement parse
+os.environ.setdefault('DATASET_APP_STORE', '0')
+
+import argparse
+import io
+import json
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from engine.editlog import EditLog, ensure_signature_at_end
+from engine.export import serialize
+from engine.filters import apply_filters
+from engine.ingestion import get_cache, load_file
+from engine.perf import rss_bytes
+
+# Tailles des datasets synthétiques (nombre de lignes)
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+FULL_SIZES = (1_000, 100_000, 1_000_000, 10_000_000, 50_000_000)
+
+# Formes des datasets : colonnes numériques ou texte, peu ou beaucoup de colonnes
+SHAPES = ('narrow_numeric', 'wide_numeric', 'narrow_text', 'wide_mixed')
+
+FORMATS = ('csv', 'json', 'parquet')
+
+# Opérations mesurées ; celles marquées d'un format sont mesurées pour chaque format
+OPERATIONS = ('export', 'load', 'load_streaming', 'filter', 'add_column', 'ensure_signature', 'edit')
+FORMAT_OPERATIONS = ('export', 'load', 'load_streaming')
+
+# Mémoire au-delà de laquelle un cas est sauté (taille estimée du DataFrame)
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3
+
+# Intervalle d'échantillonnage de la mémoire pendant une mesure
+SAMPLE_SECONDS = 0.01
+
+RESULTS_DIR = 'bench_results'
+
+# Mots des colonnes texte (en nombre limité, comme des catégories ou des noms)
+_WORDS = np.array([f'valeur_{i:05d}' for i in range(5_000)], dtype=object)
+
+
+# Fonction pour générer un dataset synthétique, de façon reproductible
+def synthetic_frame(rows, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    text = pd.StringDtype('pyarrow')
+    columns = {}
+    if shape in ('narrow_numeric', 'wide_numeric'):
+        count = 4 if shape == 'narrow_numeric' else 50
+        for i in range(count):
+            if i % 2:
+                columns[f'float_{i}'] = rng.random(rows)
+            else:
+                columns[f'int_{i}'] = rng.integers(0, 1_000, rows)
+    elif shape == 'narrow_text':
+        columns['id'] = np.arange(rows)
+        for i in range(4):
+            columns[f'text_{i}'] = pd.array(_WORDS[rng.integers(0, len(_WORDS), rows)], dtype=text)
+    elif shape == 'wide_mixed':
+        for i in range(30):
+            kind = i % 3
+            if kind == 0:
+                columns[f'int_{i}'] = rng.integers(0, 1_000, rows)
+            elif kind == 1:
+                columns[f'float_{i}'] = rng.random(rows)
+            else:
+                columns[f'text_{i}'] = pd.array(_WORDS[rng.integers(0, len(_WORDS), rows)], dtype=text)
+    else:
+        raise ValueError(f"Forme de dataset inconnue : {shape}")
+    df = pd.DataFrame(columns)
+    df['Signature'] = pd.array(np.full(rows, 'bench', dtype=object), dtype=text)
+    return df
+
+
+# Fonction pour estimer la mémoire d'un dataset synthétique sans le générer en entier
+def estimated_bytes(rows, shape):
+    sample = synthetic_frame(1_000, shape)
+    return int(sample.memory_usage(deep=True).sum() / 1_000 * rows)
+
+
+# Filtres représentatifs des pages : comparaison numérique, recherche texte, égalité
+def bench_filters(df):
+    filters = []
+    numeric = [col for col in df.columns if col.startswith('int_')]
+    text = [col for col in df.columns if col.startswith('text_')]
+    if numeric:
+        filters.append((numeric[0], 'greater_than', '100'))
+    if text:
+        filters.append((text[0], 'contains', 'valeur_0'))
+    if len(numeric) > 1:
+        filters.append((numeric[1], 'less_than', '900'))
+    return filters or [('Signature', 'equals', 'bench')]
+
+
+# Fichier en mémoire, nommé comme un upload
+class _NamedBytes(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+# Mesure d'un appel : durée et pic de mémoire (mémoire résidente et mémoire Arrow,
+# échantillonnées par un fil pendant l'appel, relativement à leur valeur au départ).
+# La mémoire déjà réservée par l'allocateur et réutilisée n'est pas comptée : le pic
+# est un minorant, fiable surtout pour les grands datasets.
+def measure(func):
+    start_rss = rss_bytes()
+    start_arrow = pa.total_allocated_bytes()
+    peaks = {'rss': start_rss, 'arrow': start_arrow}
+    running = threading.Event()
+    running.set()
+
+    def sample():
+        while running.is_set():
+            rss = rss_bytes()
+            if rss is not None and peaks['rss'] is not None:
+                peaks['rss'] = max(peaks['rss'], rss)
+            peaks['arrow'] = max(peaks['arrow'], pa.total_allocated_bytes())
+            time.sleep(SAMPLE_SECONDS)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        seconds = time.perf_counter() - start
+        running.clear()
+        sampler.join()
+    peak = None
+    if start_rss is not None:
+        peak = max(peaks['rss'] - start_rss, peaks['arrow'] - start_arrow)
+    return result, seconds, peak
+
+
+# Fonction pour préparer une opération : renvoie (fonction à mesurer, octets traités)
+def _operation(name, df, fmt, files):
+    if name == 'export':
+        return (lambda: serialize(df, fmt)), None
+    if name in ('load', 'load_streaming'):
+        data = files[fmt]
+        streaming = name == 'load_streaming'
+
+        def load():
+            # Le cache en mémoire est vidé : chaque chargement parse le fichier
+            get_cache().clear()
+            return load_file(_NamedBytes(data, f'bench.{fmt}'), streaming=streaming)
+        return load, len(data)
+    if name == 'filter':
+        filters = bench_filters(df)
+        return (lambda: apply_filters(df, filters)), None
+    if name == 'add_column':
+        # Comme la page de modification : colonne ajoutée au journal, puis vue modifiée
+        def add():
+            log = EditLog(df)
+            log.add_column('nouvelle_colonne', 'string')
+            return log.view()
+        return add, None
+    if name == 'ensure_signature':
+        # La signature est d'abord placée en tête, comme dans un fichier importé
+        shuffled = df[['Signature'] + [col for col in df.columns if col != 'Signature']]
+        return (lambda: ensure_signature_at_end(shuffled)), None
+    if name == 'edit':
+        # 1 % des cellules d'une colonne modifiées en bloc, une ligne supprimée, puis vue modifiée
+        column = df.columns[0]
+        rng = np.random.default_rng(1)
+        positions = rng.choice(len(df), max(len(df) // 100, 1), replace=False)
+        cells = [(p, column, df[column].iloc[0]) for p in positions.tolist()]
+
+        def edit():
+            log = EditLog(df)
+            log.set_cells(cells)
+            log.delete_row(0)
+            return log.view()
+        return edit, None
+    raise ValueError(f"Opération inconnue : {name}")
+
+
+# Fonction pour lancer le benchmark ; report(résultat) est appelé après chaque mesure
+def run_benchmark(sizes=DEFAULT_SIZES, shapes=SHAPES, operations=OPERATIONS, formats=FORMATS,
+                  repeat=3, max_bytes=DEFAULT_MAX_BYTES, report=None):
+    results = []
+    for shape in shapes:
+        for rows in sizes:
+            if estimated_bytes(rows, shape) > max_bytes:
+                continue
+            df = synthetic_frame(rows, shape)
+            frame_bytes = int(df.memory_usage(deep=True).sum())
+            needs_files = any(op in ('load', 'load_streaming') for op in operations)
+            files = {fmt: serialize(df, fmt) for fmt in formats} if needs_files else {}
+            for name in operations:
+                for fmt in (formats if name in FORMAT_OPERATIONS else (None,)):
+                    func, data_bytes = _operation(name, df, fmt, files)
+                    timings, peaks = [], []
+                    output = None
+                    for _ in range(repeat):
+                        output, seconds, peak = measure(func)
+                        timings.append(seconds)
+                        peaks.append(peak)
+                    if name == 'export':
+                        data_bytes = len(output)
+                    del output
+                    best = min(timings)
+                    result = {
+                        'shape': shape,
+                        'rows': rows,
+                        'columns': df.shape[1],
+                        'operation': name,
+                        'format': fmt,
+                        'seconds': best,
+                        'rows_per_second': rows / best if best else None,
+                        'mb_per_second': (data_bytes or frame_bytes) / 1024 ** 2 / best if best else None,
+                        'peak_mb': None if None in peaks else max(peaks) / 1024 ** 2,
+                        'frame_mb': frame_bytes / 1024 ** 2,
+                    }
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+            del df, files
+    return results
+
+
+# Clé d'un cas, pour comparer deux séries de résultats
+def _case(result):
+    return (result['shape'], result['rows'], result['operation'], result['format'])
+
+
+# Tableau comparant deux séries de résultats (rapport > 1 : plus lent qu'avant)
+def compare_results(previous, current):
+    before = {_case(r): r for r in previous}
+    rows = []
+    for result in current:
+        old = before.get(_case(result))
+        if old is None:
+            continue
+        rows.append({
+            'shape': result['shape'],
+            'rows': result['rows'],
+            'operation': result['operation'],
+            'format': result['format'] or '',
+            'seconds_before': old['seconds'],
+            'seconds_after': result['seconds'],
+            'time_ratio': result['seconds'] / old['seconds'] if old['seconds'] else None,
+            'peak_mb_before': old['peak_mb'],
+            'peak_mb_after': result['peak_mb'],
+        })
+    return pd.DataFrame(rows)
+
+
+# Fonction pour enregistrer les résultats avec leur contexte (versions, machine)
+def save_results(results, path, label):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    document = {
+        'label': label,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def _list(value, cast=str):
+    return tuple(cast(item) for item in value.split(',') if item)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du chargement, du filtrage, de l'édition et de l'export")
+    parser.add_argument('--sizes', type=lambda v: _list(v, int), default=DEFAULT_SIZES,
+                        help="nombres de lignes, séparés par des virgules")
+    parser.add_argument('--full', action='store_true', help="toutes les tailles, jusqu'à 50 millions de lignes")
+    parser.add_argument('--shapes', type=_list, default=SHAPES)
+    parser.add_argument('--operations', type=_list, default=OPERATIONS)
+    parser.add_argument('--formats', type=_list, default=FORMATS)
+    parser.add_argument('--repeat', type=int, default=3, help="nombre de mesures par cas (la meilleure est gardée)")
+    parser.add_argument('--max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help="sauter les datasets plus gros que cette taille estimée")
+    parser.add_argument('--label', default=datetime.now().strftime('%Y%m%d-%H%M%S'),
+                        help="nom de la série de résultats (version, commit...)")
+    parser.add_argument('--output', help=f"fichier JSON des résultats (par défaut {RESULTS_DIR}/<label>.json)")
+    parser.add_argument('--compare', help="fichier JSON de résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    for name in args.operations:
+        if name not in OPERATIONS:
+            parser.error(f"opération inconnue : {name}")
+    for shape in args.shapes:
+        if shape not in SHAPES:
+            parser.error(f"forme inconnue : {shape}")
+
+    def report(result):
+        fmt = f" {result['format']}" if result['format'] else ''
+        peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else '?'
+        print(f"{result['shape']:>15} {result['rows']:>10} {result['operation'] + fmt:<24} "
+              f"{result['seconds']:9.4f} s {result['rows_per_second']:14,.0f} lignes/s "
+              f"{result['mb_per_second']:9.1f} Mo/s  pic {peak} Mo", flush=True)
+
+    sizes = FULL_SIZES if args.full else args.sizes
+    results = run_benchmark(sizes, args.shapes, args.operations, args.formats, args.repeat,
+                            int(args.max_gb * 1024 ** 3), report)
+    output = args.output or os.path.join(RESULTS_DIR, f'{args.label}.json')
+    save_results(results, output, args.label)
+    print(f"Résultats enregistrés dans {output}")
+
+    if args.compare:
+        comparison = compare_results(load_results(args.compare), results)
+        if len(comparison):
+            print(comparison.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import sys
+
+from engine.batch import load_spec, process_file
+from engine.export import EXPORT_FORMATS
+from engine.parallel import imap_ordered
+
+
+# Fonction pour traiter un fichier dans un processus de travail : une erreur ne concerne
+# que ce fichier, elle est renvoyée dans le résumé au lieu d'arrêter les autres
+def _run_file(item):
+    input_path, output_path, spec = item
+    try:
+        return process_file(input_path, output_path, spec)
+    except (ValueError, OSError) as e:
+        return {'input': input_path, 'output': output_path, 'error': str(e)}
+
+
+# Fonction pour choisir le fichier de sortie d'un fichier d'entrée
+def _output_path(input_path, output, output_dir, fmt):
+    if output:
+        return output
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f'{stem}.{fmt}')
+
+
+# Fonction pour trouver les sorties écrites par plusieurs fichiers d'entrée, ou qui
+# remplaceraient un fichier d'entrée
+def _output_conflicts(items):
+    def same(path):
+        return os.path.normcase(os.path.realpath(path))
+
+    inputs = {same(input_path) for input_path, _, _ in items}
+    by_output = {}
+    for input_path, output_path, _ in items:
+        by_output.setdefault(same(output_path), []).append(input_path)
+    return [f"{', '.join(paths)} -> {output}" for output, paths in by_output.items()
+            if len(paths) > 1 or output in inputs]
+
+
+# Point d'entrée en ligne de commande : python -m engine (ou python -m engine.cli).
+# Chaque fichier est lu par morceaux, modifié, filtré et écrit sans passer par Streamlit ;
+# plusieurs fichiers peuvent être traités en parallèle (--jobs).
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m engine',
+        description="Traitement de fichiers sans interface : lecture, modifications, filtres et export")
+    parser.add_argument('inputs', nargs='+', help="fichiers JSON, CSV ou Parquet à traiter")
+    parser.add_argument('--spec', help="fichier de traitement JSON (ou YAML si PyYAML est installé) : "
+                                       "modifications, filters, columns, format, indent, compression, chunk_rows")
+    parser.add_argument('-o', '--output', help="fichier de sortie (un seul fichier d'entrée)")
+    parser.add_argument('--output-dir', help="dossier de sortie : <nom du fichier d'entrée>.<format>")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), help="format de sortie (remplace celui du traitement)")
+    parser.add_argument('--chunk-rows', type=int, help="nombre de lignes lues à la fois")
+    parser.add_argument('--jobs', type=int, default=1, help="nombre de fichiers traités en parallèle")
+    parser.add_argument('--quiet', action='store_true', help="n'afficher que les erreurs")
+    args = parser.parse_args(argv)
+
+    if bool(args.output) == bool(args.output_dir):
+        parser.error("indiquez soit --output, soit --output-dir")
+    if args.output and len(args.inputs) > 1:
+        parser.error("--output n'accepte qu'un fichier d'entrée : utilisez --output-dir")
+
+    try:
+        spec = load_spec(args.spec) if args.spec else {}
+    except (ValueError, OSError) as e:
+        print(f"Erreur dans le fichier de traitement : {e}", file=sys.stderr)
+        return 2
+    if args.format:
+        spec['format'] = args.format
+    if args.chunk_rows:
+        spec['chunk_rows'] = args.chunk_rows
+    fmt = spec.get('format') or (None if args.output else 'csv')
+
+    items = [(path, _output_path(path, args.output, args.output_dir, fmt), spec) for path in args.inputs]
+    # Deux fichiers d'entrée de même nom donneraient le même fichier de sortie
+    conflicts = _output_conflicts(items)
+    if conflicts:
+        parser.error("plusieurs fichiers d'entrée donnent le même fichier de sortie, "
+                     "ou une sortie remplacerait une entrée : " + ' ; '.join(conflicts))
+    workers = max(1, min(args.jobs, len(items)))
+    failed = 0
+    for result in imap_ordered(_run_file, items, workers, processes=workers > 1):
+        if 'error' in result:
+            failed += 1
+            print(f"{result['input']} : {result['error']}", file=sys.stderr)
+        elif not args.quiet:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
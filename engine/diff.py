@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from engine.perf import stage
+
+# Statut des lignes du résultat d'une comparaison
+ADDED = 'ajoutée'
+REMOVED = 'supprimée'
+CHANGED = 'modifiée'
+
+
+# Fonction pour calculer la clé de chaque ligne d'un DataFrame : les colonnes clés
+# hachées ensemble, ou à défaut l'index (utilisé tel quel s'il est entier)
+def row_keys(df, key_columns=None):
+    if key_columns:
+        missing = [col for col in key_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Colonnes clés absentes : {', '.join(missing)}")
+        return pd.util.hash_pandas_object(df[list(key_columns)], index=False).to_numpy()
+    if pd.api.types.is_integer_dtype(df.index.dtype):
+        return df.index.to_numpy(dtype=np.int64)
+    return pd.util.hash_pandas_object(df.index).to_numpy()
+
+
+# Fonction pour trier des clés de lignes en vérifiant qu'elles sont uniques : renvoie
+# l'ordre de tri (None si les clés sont déjà triées, cas de l'index d'un résultat filtré)
+def _sorted_order(keys, side):
+    order = None
+    if len(keys) > 1 and not (keys[1:] > keys[:-1]).all():
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        if (sorted_keys[1:] == sorted_keys[:-1]).any():
+            raise ValueError(f"Clés de lignes en double ({side}) : choisissez des colonnes clés qui identifient chaque ligne")
+    return order
+
+
+# Fonction pour associer les lignes de deux DataFrames par leur clé : positions des
+# lignes présentes des deux côtés (avant, après), et masque des lignes trouvées de
+# chaque côté
+def _match(old_keys, new_keys):
+    order = _sorted_order(old_keys, 'avant')
+    _sorted_order(new_keys, 'après')
+    sorted_keys = old_keys if order is None else old_keys[order]
+    if not len(old_keys):
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.zeros(0, dtype=bool), np.zeros(len(new_keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, new_keys), len(old_keys) - 1)
+    found = sorted_keys[positions] == new_keys
+    new_matched = np.flatnonzero(found)
+    old_matched = positions[found] if order is None else order[positions[found]]
+    old_found = np.zeros(len(old_keys), dtype=bool)
+    old_found[old_matched] = True
+    return old_matched, new_matched, old_found, found
+
+
+# Fonction pour trouver les valeurs différentes entre deux colonnes alignées (masque numpy).
+# Deux valeurs manquantes sont égales ; des types non comparables entre eux (catégories
+# différentes...) sont comparés valeur par valeur.
+def _changed_mask(before, after):
+    before = before.reset_index(drop=True)
+    after = after.reset_index(drop=True)
+    try:
+        equal = (before == after).to_numpy(dtype=bool, na_value=False)
+    except TypeError:
+        equal = before.astype(object).to_numpy() == after.astype(object).to_numpy()
+    both_missing = before.isna().to_numpy() & after.isna().to_numpy()
+    return ~(equal | both_missing)
+
+
+# Fonction pour extraire des lignes d'une colonne ; des positions consécutives (cas le
+# plus courant : lignes dans le même ordre) donnent une tranche, sans copie
+def _rows(series, positions):
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return series.iloc[positions[0]:positions[-1] + 1]
+    return series.take(positions)
+
+
+# Fonction pour convertir des valeurs en texte pour le résultat (valeurs manquantes gardées)
+def _as_text(values):
+    values = pd.Series(values, dtype=object)
+    return values.where(values.isna(), values.astype(str))
+
+
+# Fonction pour obtenir les libellés (index) de lignes, en entiers si possible
+def _labels(index, positions):
+    labels = index[positions]
+    if pd.api.types.is_integer_dtype(labels.dtype):
+        return pd.array(labels, dtype='Int64')
+    return _as_text(labels).to_numpy()
+
+
+# Résultat compact d'une comparaison : compteurs et tableau des différences, une ligne
+# par ligne ajoutée ou supprimée et une ligne par cellule modifiée
+class FrameDiff:
+    def __init__(self, changes, added_rows, removed_rows, changed_rows, added_columns, removed_columns):
+        self.changes = changes
+        self.added_rows = added_rows
+        self.removed_rows = removed_rows
+        self.changed_rows = changed_rows
+        self.added_columns = added_columns
+        self.removed_columns = removed_columns
+
+    @property
+    def changed_cells(self):
+        return int((self.changes['Statut'] == CHANGED).sum())
+
+    def is_empty(self):
+        return not (len(self.changes) or self.added_columns or self.removed_columns)
+
+    # Résumé lisible de la comparaison
+    def summary(self):
+        parts = [
+            f"{self.added_rows} ligne(s) ajoutée(s)",
+            f"{self.removed_rows} ligne(s) supprimée(s)",
+            f"{self.changed_rows} ligne(s) modifiée(s) ({self.changed_cells} cellule(s))",
+        ]
+        if self.added_columns:
+            parts.append(f"colonnes ajoutées : {', '.join(map(str, self.added_columns))}")
+        if self.removed_columns:
+            parts.append(f"colonnes supprimées : {', '.join(map(str, self.removed_columns))}")
+        return ', '.join(parts)
+
+
+# Fonction pour comparer deux versions d'un DataFrame. Les lignes sont associées par
+# une clé (voir row_keys, ou keys=(clés avant, clés après) déjà connues), puis les
+# colonnes communes sont comparées colonne par colonne sur les lignes associées.
+def diff_frames(old, new, key_columns=None, keys=None):
+    with stage('diff', rows_before=len(old), rows_after=len(new)) as details:
+        old_keys, new_keys = keys if keys is not None else (row_keys(old, key_columns), row_keys(new, key_columns))
+        old_matched, new_matched, old_found, new_found = _match(np.asarray(old_keys), np.asarray(new_keys))
+
+        # Colonnes communes comparées sur les lignes présentes des deux côtés
+        common = [col for col in new.columns if col in old.columns]
+
+        parts = []
+        changed_rows = np.zeros(len(old_matched), dtype=bool)
+        for col in common:
+            before = _rows(old[col], old_matched)
+            after = _rows(new[col], new_matched)
+            changed = _changed_mask(before, after)
+            if not changed.any():
+                continue
+            changed_rows |= changed
+            parts.append(pd.DataFrame({
+                'Statut': CHANGED,
+                'Ligne (avant)': _labels(old.index, old_matched[changed]),
+                'Ligne (après)': _labels(new.index, new_matched[changed]),
+                'Colonne': str(col),
+                'Avant': _as_text(before.to_numpy()[changed]).to_numpy(),
+                'Après': _as_text(after.to_numpy()[changed]).to_numpy(),
+            }))
+
+        removed = np.flatnonzero(~old_found)
+        added = np.flatnonzero(~new_found)
+        if len(removed):
+            parts.append(pd.DataFrame({'Statut': REMOVED, 'Ligne (avant)': _labels(old.index, removed)}))
+        if len(added):
+            parts.append(pd.DataFrame({'Statut': ADDED, 'Ligne (après)': _labels(new.index, added)}))
+        columns = ['Statut', 'Ligne (avant)', 'Ligne (après)', 'Colonne', 'Avant', 'Après']
+        changes = pd.concat(parts, ignore_index=True).reindex(columns=columns) if parts else pd.DataFrame(columns=columns)
+
+        result = FrameDiff(
+            changes,
+            added_rows=len(added),
+            removed_rows=len(removed),
+            changed_rows=int(changed_rows.sum()),
+            added_columns=[col for col in new.columns if col not in old.columns],
+            removed_columns=[col for col in old.columns if col not in new.columns],
+        )
+        details['differences'] = len(changes)
+    return result
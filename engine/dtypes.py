@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Une colonne texte devient catégorielle si elle a peu de valeurs distinctes
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_UNIQUES = 100_000
+
+# Texte stocké dans des tableaux Arrow (une seule allocation, pas un objet Python par valeur)
+ARROW_STRING = pd.StringDtype('pyarrow')
+
+
+# Fonction pour réduire un entier à son plus petit type, sans perte
+def _downcast_integer(series):
+    if len(series) == 0:
+        return series
+    kind = 'unsigned' if series.min() >= 0 else 'integer'
+    return pd.to_numeric(series, downcast=kind)
+
+
+# Fonction pour passer un flottant en float32 seulement si toutes les valeurs sont conservées
+def _downcast_float(series):
+    values = series.to_numpy()
+    with np.errstate(over='ignore', invalid='ignore'):
+        narrow = values.astype(np.float32)
+    same = (narrow.astype(np.float64) == values) | (np.isnan(values) & np.isnan(narrow))
+    if same.all():
+        return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+
+# Fonction pour convertir une colonne de texte en catégorielle ou en texte Arrow
+def _compact_text(series, category_max_ratio, category_max_uniques):
+    if not (isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow'):
+        series = series.astype(ARROW_STRING)
+    uniques = series.nunique(dropna=True)
+    if len(series) and uniques <= category_max_uniques and uniques <= len(series) * category_max_ratio:
+        return series.astype('category')
+    return series
+
+
+# Fonction pour choisir le type le plus compact d'une colonne, sans perdre d'information
+def optimize_column(series, category_max_ratio=CATEGORY_MAX_RATIO, category_max_uniques=CATEGORY_MAX_UNIQUES):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return series
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return _downcast_integer(series)
+    if pd.api.types.is_float_dtype(dtype) and dtype == np.float64:
+        return _downcast_float(series)
+    if dtype == object:
+        # Seules les colonnes entièrement textuelles sont converties
+        if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+            return series
+        return _compact_text(series, category_max_ratio, category_max_uniques)
+    if pd.api.types.is_string_dtype(dtype):
+        return _compact_text(series, category_max_ratio, category_max_uniques)
+    return series
+
+
+# Fonction pour optimiser les types de toutes les colonnes. Renvoie un nouveau DataFrame.
+def optimize_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO, category_max_uniques=CATEGORY_MAX_UNIQUES):
+    if df.shape[1] == 0:
+        return df.copy(deep=False)
+    columns = [optimize_column(df.iloc[:, i], category_max_ratio, category_max_uniques) for i in range(df.shape[1])]
+    optimized = pd.concat(columns, axis=1)
+    optimized.columns = df.columns
+    return optimized
+
+
+# Fonction pour comparer la mémoire occupée par chaque colonne avant et après optimisation
+def memory_report(before, after):
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'Colonne': [str(col) for col in before.columns],
+        "Type d'origine": [str(dtype) for dtype in before.dtypes],
+        'Type optimisé': [str(dtype) for dtype in after.dtypes],
+        'Mémoire avant (Mo)': (before_bytes.to_numpy() / 1024 ** 2).round(3),
+        'Mémoire après (Mo)': (after_bytes.to_numpy() / 1024 ** 2).round(3),
+    })
+    ratio = after_bytes.to_numpy() / np.maximum(before_bytes.to_numpy(), 1)
+    report['Gain (%)'] = ((1 - ratio) * 100).round(1)
+    return report
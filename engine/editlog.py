@@ -0,0 +1,227 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from engine.patches import scatter_column
+
+# Valeur par défaut des colonnes ajoutées, selon leur type
+COLUMN_DEFAULTS = {'string': "", 'int': 0, 'float': 0.0}
+
+
+# Fonction pour s'assurer que la signature est à la fin du DataFrame
+def ensure_signature_at_end(df):
+    if 'Signature' in df.columns:
+        columns = [col for col in df.columns if col != 'Signature'] + ['Signature']
+        df = df[columns]
+    return df
+
+
+# Fonction pour ajouter des lignes vides à la fin d'un DataFrame en gardant le type
+# des colonnes : les entiers et booléens passent dans leur version acceptant les
+# valeurs manquantes, les autres types (catégories, texte, flottants) sont conservés
+def _append_empty_rows(df, count):
+    nullable = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, np.dtype) and dtype.kind in 'iub':
+            nullable[col] = 'boolean' if dtype.kind == 'b' else dtype.name.capitalize().replace('Uint', 'UInt')
+    if nullable:
+        df = df.astype(nullable)
+    return df.reindex(pd.RangeIndex(len(df) + count))
+
+
+# État courant d'un journal de modifications, recalculé à partir des opérations :
+# identifiants des lignes supprimées (tombes), colonnes et cellules modifiées
+class _EditState:
+    def __init__(self, base):
+        self.next_row_id = len(base)
+        self.deleted_rows = set()
+        # Colonne -> ('base', None) ou ('default', (valeur, premier id de ligne sans défaut))
+        self.columns = {col: ('base', None) for col in base.columns}
+        # Colonne -> {id de ligne: valeur}
+        self.patches = {}
+        self._row_ids = None
+
+    def row_ids(self):
+        if self._row_ids is None:
+            ids = np.arange(self.next_row_id)
+            if self.deleted_rows:
+                ids = np.setdiff1d(ids, np.fromiter(self.deleted_rows, dtype=np.int64), assume_unique=True)
+            self._row_ids = ids
+        return self._row_ids
+
+    def apply(self, op):
+        kind = op[0]
+        if kind == 'add_row':
+            self.next_row_id += 1
+        elif kind == 'delete_row':
+            row_ids = self.row_ids()
+            if 0 <= op[1] < len(row_ids):
+                self.deleted_rows.add(int(row_ids[op[1]]))
+        elif kind == 'add_column':
+            _, name, col_type = op
+            self.columns[name] = ('default', (COLUMN_DEFAULTS[col_type], self.next_row_id))
+            self.patches.pop(name, None)
+        elif kind == 'delete_column':
+            self.columns.pop(op[1], None)
+            self.patches.pop(op[1], None)
+        elif kind == 'set_cells':
+            row_ids = self.row_ids()
+            for position, name, value in op[1]:
+                if 0 <= position < len(row_ids):
+                    if name not in self.columns:
+                        self.columns[name] = ('default', (None, 0))
+                    self.patches.setdefault(name, {})[int(row_ids[position])] = value
+        self._row_ids = None
+
+
+# Journal de modifications d'un DataFrame : le DataFrame de base n'est jamais
+# modifié, les opérations sont enregistrées sous forme compacte (tombes de lignes,
+# colonnes ajoutées ou supprimées, cellules modifiées) et la vue modifiée n'est
+# construite qu'à la demande. La mémoire utilisée croît avec le nombre de
+# modifications, pas avec la taille du dataset. Annuler et rétablir ne font que
+# rejouer les opérations sur les identifiants de lignes.
+class EditLog:
+    def __init__(self, base, key=None):
+        self.base = base
+        self.key = key
+        self._ops = []
+        self._undone = []
+        self._state = None
+        self._view = None
+
+    def __len__(self):
+        return len(self._ops)
+
+    @property
+    def operations(self):
+        return list(self._ops)
+
+    def can_undo(self):
+        return bool(self._ops)
+
+    def can_redo(self):
+        return bool(self._undone)
+
+    # Remplacer le DataFrame de base par un DataFrame identique (rechargé après éviction du cache)
+    def rebind(self, base):
+        if base is not self.base:
+            self.base = base
+            self._invalidate()
+
+    def _invalidate(self):
+        self._state = None
+        self._view = None
+
+    def _record(self, op):
+        self._ops.append(op)
+        self._undone = []
+        if self._state is not None:
+            self._state.apply(op)
+        self._view = None
+
+    def state(self):
+        if self._state is None:
+            state = _EditState(self.base)
+            for op in self._ops:
+                state.apply(op)
+            self._state = state
+        return self._state
+
+    def add_row(self):
+        self._record(('add_row',))
+
+    def delete_row(self, position):
+        self._record(('delete_row', int(position)))
+
+    def add_column(self, name, col_type):
+        if col_type not in COLUMN_DEFAULTS:
+            raise ValueError(f"Type de colonne inconnu : {col_type}")
+        self._record(('add_column', name, col_type))
+
+    def delete_column(self, name):
+        self._record(('delete_column', name))
+
+    # Modifications de cellules : liste de (position de ligne, colonne, valeur)
+    def set_cells(self, cells):
+        cells = [(int(position), name, value) for position, name, value in cells]
+        if cells:
+            self._record(('set_cells', cells))
+
+    def undo(self):
+        if self._ops:
+            self._undone.append(self._ops.pop())
+            self._invalidate()
+
+    def redo(self):
+        if self._undone:
+            self._ops.append(self._undone.pop())
+            self._invalidate()
+
+    # Empreinte des opérations enregistrées : avec la clé du DataFrame de base, elle
+    # identifie la vue modifiée (résultats partagés dans le magasin, voir engine.store)
+    def fingerprint(self):
+        return hashlib.blake2b(repr(self._ops).encode('utf-8'), digest_size=16).hexdigest()
+
+    # Nombre de lignes de la vue modifiée, sans la construire
+    def row_count(self):
+        return len(self.state().row_ids())
+
+    # Identifiant de chaque ligne de la vue modifiée : sa position dans le DataFrame de
+    # base, ou une valeur au-delà pour une ligne ajoutée (voir engine.diff)
+    def row_ids(self):
+        return self.state().row_ids()
+
+    def columns(self):
+        columns = list(self.state().columns)
+        if 'Signature' in columns:
+            columns = [col for col in columns if col != 'Signature'] + ['Signature']
+        return columns
+
+    # Vue modifiée du DataFrame, construite une fois par version du journal
+    # (sans modification, c'est le DataFrame de base lui-même)
+    def view(self):
+        if not self._ops:
+            return self.base
+        if self._view is None:
+            self._view = self._materialize()
+        return self._view
+
+    def _materialize(self):
+        state = self.state()
+        row_ids = state.row_ids()
+        base_count = len(self.base)
+        split = np.searchsorted(row_ids, base_count)
+        base_ids, added_count = row_ids[:split], len(row_ids) - split
+
+        base_columns = [col for col, (source, _) in state.columns.items() if source == 'base']
+        df = self.base[base_columns].take(base_ids).reset_index(drop=True)
+        if added_count:
+            df = _append_empty_rows(df, added_count)
+
+        for col, (source, spec) in state.columns.items():
+            if source != 'default':
+                continue
+            default, first_without_default = spec
+            if default is None or first_without_default > row_ids[-1:].max(initial=-1):
+                df[col] = default
+            else:
+                # Lignes ajoutées après la colonne : valeurs manquantes, la colonne gardant
+                # son type (version acceptant les valeurs manquantes, comme _append_empty_rows)
+                column = pd.Series(default, index=df.index)
+                if column.dtype.kind in 'iub':
+                    column = column.astype(column.dtype.name.capitalize())
+                df[col] = column.where(row_ids < first_without_default)
+
+        # Une seule écriture vectorisée par colonne, valeurs converties une fois à son type
+        for col, cells in state.patches.items():
+            if col not in state.columns or not cells:
+                continue
+            ids = np.fromiter(cells, dtype=np.int64, count=len(cells))
+            values = np.fromiter(cells.values(), dtype=object, count=len(cells))
+            positions = np.searchsorted(row_ids, ids)
+            present = (positions < len(row_ids)) & (row_ids[np.minimum(positions, len(row_ids) - 1)] == ids)
+            df[col] = scatter_column(df[col], positions[present], values[present])
+
+        df = df[list(state.columns)]
+        return ensure_signature_at_end(df)
@@ -0,0 +1,298 @@
+import functools
+import io
+import itertools
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from engine.parallel import imap_ordered, use_parallel
+from engine.perf import stage
+from engine.streaming import conform_table
+
+# Formats d'export : type MIME associé
+EXPORT_FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'parquet': 'application/octet-stream',
+}
+
+# Compressions Parquet proposées
+PARQUET_COMPRESSIONS = ['snappy', 'zstd', 'gzip', 'none']
+
+# Nombre de lignes sérialisées à la fois
+CHUNK_ROWS = 100_000
+
+# Taille à partir de laquelle le tampon d'export passe de la mémoire au disque
+SPOOL_MAX_BYTES = 32 * 1024 ** 2
+
+# Mémoire maximale occupée par les exports gardés en cache
+EXPORT_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+
+# Fonction pour découper un DataFrame en morceaux de lignes
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# Fonction pour sérialiser des morceaux dans l'ordre : sur un grand DataFrame, les
+# morceaux sont répartis sur des processus (la sérialisation pandas garde le GIL)
+def _serialized_chunks(func, df, chunk_rows, workers, progress):
+    chunks = iter_chunks(df, chunk_rows)
+    total = max(-(-len(df) // chunk_rows), 1)
+    if not use_parallel(len(df), workers):
+        workers = 1
+    return imap_ordered(func, enumerate(chunks), workers, processes=True, progress=progress, total=total)
+
+
+# Fonction pour sérialiser un morceau en CSV (la ligne d'en-tête avec le premier seulement)
+def _csv_chunk(item):
+    i, chunk = item
+    return chunk.to_csv(index=False, header=(i == 0)).encode('utf-8')
+
+
+# Fonction pour écrire un DataFrame en CSV, morceau par morceau
+def write_csv(df, out, chunk_rows=CHUNK_ROWS, workers=None, progress=None):
+    for data in _serialized_chunks(_csv_chunk, df, chunk_rows, workers, progress):
+        out.write(data)
+
+
+# Fonction pour sérialiser un morceau en enregistrements JSON, sans les crochets du tableau
+def _json_chunk(item, indent=None):
+    _, chunk = item
+    text = chunk.to_json(orient='records', indent=indent)[1:-1]
+    if indent:
+        text = text.strip('\n')
+    return text.encode('utf-8')
+
+
+# Fonction pour écrire un DataFrame en tableau JSON d'enregistrements, morceau par morceau.
+# Le résultat est identique à df.to_json(orient='records', indent=indent).
+def write_json(df, out, chunk_rows=CHUNK_ROWS, indent=None, workers=None, progress=None):
+    if len(df) <= chunk_rows:
+        out.write(df.to_json(orient='records', indent=indent).encode('utf-8'))
+        return
+    separator = (',\n' if indent else ',').encode('utf-8')
+    out.write(b'[\n' if indent else b'[')
+    func = functools.partial(_json_chunk, indent=indent)
+    for i, data in enumerate(_serialized_chunks(func, df, chunk_rows, workers, progress)):
+        if i:
+            out.write(separator)
+        out.write(data)
+    out.write(b'\n]' if indent else b']')
+
+
+# Fonction pour convertir les colonnes 'object' en texte, sans modifier le DataFrame d'origine
+def parquet_compatible(df):
+    object_columns = [col for col in df.columns if df[col].dtype == 'object']
+    if not object_columns:
+        return df
+    return df.astype({col: 'string' for col in object_columns})
+
+
+# Fonction pour écrire un DataFrame en Parquet, un groupe de lignes à la fois.
+# Sur un grand DataFrame, les groupes suivants sont convertis en Arrow sur d'autres
+# fils pendant que le groupe courant est encodé et compressé.
+def write_parquet(df, out, row_group_size=CHUNK_ROWS, compression='snappy', workers=None, progress=None):
+    schema = pa.Schema.from_pandas(parquet_compatible(df.iloc[:0]), preserve_index=False)
+    total = max(-(-len(df) // row_group_size), 1)
+    tables = imap_ordered(
+        lambda chunk: pa.Table.from_pandas(parquet_compatible(chunk), schema=schema, preserve_index=False),
+        iter_chunks(df, row_group_size),
+        workers if use_parallel(len(df), workers) else 1,
+        progress=progress,
+        total=total,
+    )
+    with pq.ParquetWriter(out, schema, compression=compression) as writer:
+        for table in tables:
+            writer.write_table(table, row_group_size=row_group_size)
+
+
+# Export écrit morceau par morceau quand les morceaux arrivent au fil d'une lecture
+# (voir engine.batch) : le DataFrame complet n'existe jamais en mémoire. En Parquet,
+# le schéma est celui du premier morceau ; si la lecture élargit ensuite un type de
+# colonne (voir engine.streaming), les groupes déjà écrits sont réécrits avec le
+# schéma élargi, ce qui demande un flux relisible (ouvert en 'w+b').
+# À utiliser dans un bloc with : en cas d'erreur, l'écrivain Parquet est fermé sans
+# terminer le fichier.
+class StreamingExport:
+    def __init__(self, fmt, out, indent=None, compression='snappy'):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Format d'export inconnu : {fmt}")
+        self.fmt = fmt
+        self.out = out
+        self.indent = indent
+        self.compression = compression
+        self.rows = 0
+        self._chunks = 0
+        self._writer = None
+        self._schema = None
+        self._start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, chunk):
+        if self.fmt == 'csv':
+            self.out.write(_csv_chunk((self._chunks, chunk)))
+        elif self.fmt == 'json':
+            if len(chunk):
+                if self.rows:
+                    self.out.write(b',\n' if self.indent else b',')
+                else:
+                    self.out.write(b'[\n' if self.indent else b'[')
+                self.out.write(_json_chunk((self._chunks, chunk), self.indent))
+        else:
+            table = pa.Table.from_pandas(parquet_compatible(chunk), preserve_index=False)
+            if self._writer is None:
+                self._start = self.out.tell()
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.out, self._schema, compression=self.compression)
+            elif not table.schema.equals(self._schema):
+                table, schema = conform_table(table, self._schema)
+                if not schema.equals(self._schema):
+                    self._widen(schema)
+            self._writer.write_table(table)
+        self.rows += len(chunk)
+        self._chunks += 1
+
+    # Réécrire les groupes déjà écrits avec un schéma élargi. Les métadonnées pandas du
+    # premier morceau (types d'origine) ne correspondent plus : elles sont retirées.
+    def _widen(self, schema):
+        schema = schema.remove_metadata()
+        self._writer.close()
+        self._writer = None
+        try:
+            with tempfile.TemporaryFile() as previous:
+                self.out.seek(self._start)
+                shutil.copyfileobj(self.out, previous)
+                previous.seek(0)
+                self.out.seek(self._start)
+                self.out.truncate()
+                self._writer = pq.ParquetWriter(self.out, schema, compression=self.compression)
+                parquet_file = pq.ParquetFile(previous)
+                for i in range(parquet_file.num_row_groups):
+                    self._writer.write_table(conform_table(parquet_file.read_row_group(i), schema)[0])
+        except io.UnsupportedOperation:
+            raise ValueError("Types de colonnes différents d'un morceau à l'autre : "
+                             "le fichier Parquet ne peut pas être réécrit")
+        self._schema = schema
+
+    def close(self):
+        if self.fmt == 'json':
+            if self.rows:
+                self.out.write(b'\n]' if self.indent else b']')
+            else:
+                self.out.write(b'[]')
+        elif self.fmt == 'parquet' and self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# Fonction pour exporter dans un flux binaire ouvert (tampon, fichier...), morceau par morceau.
+# progress(fait, total) suit l'avancement en morceaux.
+def export_to(df, fmt, out, chunk_rows=CHUNK_ROWS, indent=None, compression='snappy', row_group_size=None,
+              workers=None, progress=None):
+    if fmt == 'csv':
+        write_csv(df, out, chunk_rows, workers, progress)
+    elif fmt == 'json':
+        write_json(df, out, chunk_rows, indent, workers, progress)
+    elif fmt == 'parquet':
+        write_parquet(df, out, row_group_size or chunk_rows, compression, workers, progress)
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+
+# Fonction pour sérialiser un DataFrame dans un tampon (mémoire puis disque) et renvoyer les octets
+def serialize(df, fmt, progress=None, **options):
+    with stage('export', format=fmt, rows=len(df)) as info:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as out:
+            export_to(df, fmt, out, progress=progress, **options)
+            out.seek(0)
+            data = out.read()
+        info['bytes'] = len(data)
+    return data
+
+
+# Versions des DataFrames : un numéro par objet, libéré quand l'objet disparaît.
+# Un DataFrame exporté ne doit donc plus être modifié en place.
+_versions = {}
+_versions_lock = threading.RLock()
+_version_counter = itertools.count(1)
+
+
+def frame_version(df):
+    with _versions_lock:
+        entry = _versions.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        frame_id = id(df)
+        version = next(_version_counter)
+
+        def forget(_, frame_id=frame_id, version=version):
+            with _versions_lock:
+                if frame_id in _versions and _versions[frame_id][1] == version:
+                    del _versions[frame_id]
+        _versions[frame_id] = (weakref.ref(df, forget), version)
+        return version
+
+
+# Cache LRU des exports, borné par la taille des octets produits
+class ExportCache:
+    def __init__(self, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._total -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._total += len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._total -= len(old)
+
+
+_cache = ExportCache()
+
+
+# Clé d'un export : version du DataFrame, format et options
+def export_key(df, fmt, **options):
+    return (frame_version(df), fmt, tuple(sorted(options.items())))
+
+
+# Fonction pour obtenir un export déjà calculé pour cette version du DataFrame, ou None
+def cached_export(df, fmt, **options):
+    return _cache.get(export_key(df, fmt, **options))
+
+
+# Fonction pour exporter un DataFrame : calculé à la première demande, puis gardé en cache
+def export_bytes(df, fmt, progress=None, **options):
+    key = export_key(df, fmt, **options)
+    data = _cache.get(key)
+    if data is None:
+        data = serialize(df, fmt, progress=progress, **options)
+        _cache.put(key, data)
+    return data
@@ -0,0 +1,244 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from engine.parallel import PARALLEL_MIN_ROWS, imap_ordered, row_partitions, use_parallel
+from engine.perf import timed
+from engine.search import contains_mask
+
+# Conditions de filtrage disponibles
+CONDITIONS = ['equals', 'contains', 'greater_than', 'less_than', 'between']
+
+# Coût relatif d'évaluation de chaque condition ('contains' convertit la colonne en texte)
+CONDITION_COST = {
+    'equals': 1.0,
+    'greater_than': 1.0,
+    'less_than': 1.0,
+    'between': 2.0,
+    'contains': 20.0,
+}
+
+# En dessous de ce nombre de lignes, on ne mesure pas la sélectivité des filtres
+SELECTIVITY_MIN_ROWS = 50_000
+
+# Nombre de lignes de l'échantillon utilisé pour estimer la sélectivité
+SELECTIVITY_SAMPLE_ROWS = 2_000
+
+
+# Fonction pour convertir les valeurs des filtres au type de la colonne
+def convert_value(value, dtype):
+    if pd.api.types.is_bool_dtype(dtype) or not isinstance(value, str):
+        return value
+    try:
+        if pd.api.types.is_integer_dtype(dtype):
+            return int(value)
+        elif pd.api.types.is_float_dtype(dtype):
+            return float(value)
+    except ValueError:
+        raise ValueError(f"Valeur '{value}' invalide pour une colonne de type {dtype}")
+    return value
+
+
+# Fonction pour convertir un masque pandas en tableau numpy de booléens (NA = faux)
+def _to_bool(mask):
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+# Fonction pour évaluer une condition sur une colonne, renvoie un masque numpy
+def condition_mask(series, condition, value):
+    col_dtype = series.dtype
+    # Colonne catégorielle : la condition est évaluée une fois par catégorie
+    if isinstance(col_dtype, pd.CategoricalDtype):
+        categories = pd.Series(col_dtype.categories)
+        hits = np.append(condition_mask(categories, condition, value), False)
+        return hits[series.cat.codes.to_numpy()]
+    if condition == 'equals':
+        return _to_bool(series == convert_value(value, col_dtype))
+    elif condition == 'contains':
+        return contains_mask(series, value)
+    elif condition == 'greater_than':
+        return _to_bool(series > convert_value(value, col_dtype))
+    elif condition == 'less_than':
+        return _to_bool(series < convert_value(value, col_dtype))
+    elif condition == 'between':
+        min_value, max_value = value
+        min_value = convert_value(min_value, col_dtype)
+        max_value = convert_value(max_value, col_dtype)
+        return _to_bool(series.between(min_value, max_value))
+    raise ValueError(f"Condition inconnue : {condition}")
+
+
+# Fonction pour estimer la part des lignes qui passent un filtre, sur un échantillon
+def _selectivity(df, column_name, condition, value):
+    step = max(len(df) // SELECTIVITY_SAMPLE_ROWS, 1)
+    sample = df[column_name].iloc[::step]
+    return float(condition_mask(sample, condition, value).mean())
+
+
+# Fonction pour compiler une liste de filtres (colonne, condition, valeur).
+# Les filtres sont ordonnés pour évaluer d'abord les plus sélectifs et les moins coûteux.
+def compile_filters(df, filters):
+    for column_name, condition, _ in filters:
+        if column_name not in df.columns:
+            raise ValueError(f"Colonne inconnue : {column_name}")
+        if condition not in CONDITION_COST:
+            raise ValueError(f"Condition inconnue : {condition}")
+
+    filters = list(filters)
+    if len(filters) < 2:
+        return filters
+    if len(df) < SELECTIVITY_MIN_ROWS:
+        return sorted(filters, key=lambda f: CONDITION_COST[f[1]])
+
+    # Rang classique d'ordonnancement des prédicats : coût / part des lignes éliminées
+    def rank(f):
+        selectivity = _selectivity(df, *f)
+        return CONDITION_COST[f[1]] / max(1.0 - selectivity, 1e-6)
+    return sorted(filters, key=rank)
+
+
+# Fonction pour évaluer des filtres compilés sur des partitions de lignes, en parallèle
+# (numpy et Arrow libèrent le GIL), puis rassembler les positions dans l'ordre
+def _evaluate_partitions(df, compiled, positions, text, workers, progress):
+    if positions is None:
+        chunks = [np.arange(start, stop) for start, stop in row_partitions(len(df), workers)]
+    else:
+        chunks = np.array_split(positions, len(row_partitions(len(positions), workers)))
+    parts = imap_ordered(lambda chunk: evaluate(df, compiled, chunk, text=text, workers=1), chunks,
+                         workers, progress=progress, total=len(chunks))
+    return np.concatenate(list(parts))
+
+
+# Fonction pour évaluer des filtres compilés : chaque filtre n'est évalué
+# que sur les lignes retenues par les précédents. Renvoie les positions des lignes.
+# Si des index sont fournis (voir engine.indexes), le premier filtre les utilise ;
+# une recherche texte (voir engine.search) sert à toutes les conditions 'contains'.
+# Sur un grand nombre de lignes, l'évaluation est répartie sur plusieurs cœurs
+# (voir engine.parallel) ; progress(fait, total) suit l'avancement. Avec un seul
+# cœur, les partitions sont évaluées l'une après l'autre quand progress est fourni,
+# pour que la tâche puisse être annulée entre deux partitions (voir engine.jobs).
+def evaluate(df, compiled, positions=None, indexes=None, text=None, workers=None, progress=None):
+    if indexes is not None and indexes.df is not df:
+        indexes = None
+    if text is not None and text.df is not df:
+        text = None
+    rows = len(df) if positions is None else len(positions)
+    partitioned = use_parallel(rows, workers) or (progress is not None and rows >= PARALLEL_MIN_ROWS)
+    # Les index répondent sans parcourir les lignes : inutile de partitionner
+    if compiled and partitioned and not (positions is None and indexes is not None):
+        return _evaluate_partitions(df, compiled, positions, text, workers, progress)
+    for column_name, condition, value in compiled:
+        if positions is not None and len(positions) == 0:
+            break
+        series = df[column_name]
+        if condition == 'contains' and text is not None:
+            mask = text.contains(column_name, value, positions)
+            positions = np.flatnonzero(mask) if positions is None else positions[mask]
+            continue
+        if positions is None:
+            if indexes is not None:
+                positions = indexes.lookup(column_name, condition, value)
+                if positions is not None:
+                    continue
+            positions = np.flatnonzero(condition_mask(series, condition, value))
+        else:
+            mask = condition_mask(series.take(positions), condition, value)
+            positions = positions[mask]
+    if positions is None:
+        positions = np.arange(len(df))
+    return positions
+
+
+# Fonction pour obtenir les positions des lignes qui passent tous les filtres
+@timed('filter_indices')
+def filter_indices(df, filters, indexes=None, text=None, progress=None):
+    return evaluate(df, compile_filters(df, filters), indexes=indexes, text=text, progress=progress)
+
+
+# Fonction pour appliquer les filtres : une seule copie, à la fin
+@timed('apply_filters')
+def apply_filters(df, filters, indexes=None, text=None, progress=None):
+    if not filters:
+        return df.copy(deep=False)
+    return df.take(filter_indices(df, filters, indexes, text, progress))
+
+
+# Fonction pour rendre un filtre utilisable comme clé (les valeurs 'between' peuvent être des listes)
+def _filter_key(f):
+    column_name, condition, value = f
+    if isinstance(value, list):
+        value = tuple(value)
+    return (column_name, condition, value)
+
+
+# Fonction pour obtenir la clé du résultat d'une liste de filtres sur un dataset
+# (l'ordre des filtres ne change pas le résultat)
+def result_key(dataset_key, filters):
+    return f"{dataset_key}|filters:{sorted(repr(_filter_key(f)) for f in filters)}"
+
+
+# Cache des résultats intermédiaires d'une chaîne de filtres, pour un DataFrame donné.
+# Les filtres étant combinés par un ET, le résultat d'un ensemble de filtres ne dépend
+# pas de leur ordre : on garde les positions obtenues pour chaque sous-ensemble évalué.
+# Ajouter un filtre ne fait que restreindre le dernier résultat, et en supprimer un
+# repart du plus grand sous-ensemble déjà calculé.
+# Le cache peut servir depuis une tâche de fond (voir engine.jobs) : ses entrées sont
+# protégées par un verrou, l'évaluation des filtres se faisant hors du verrou.
+class FilterChainCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._df_ref = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bind(self, df):
+        if self._df_ref is None or self._df_ref() is not df:
+            self._df_ref = weakref.ref(df)
+            self._results.clear()
+
+    def _store(self, df, key, positions):
+        with self._lock:
+            if self._df_ref is None or self._df_ref() is not df:
+                return
+            self._results[key] = positions
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._df_ref = None
+            self._results.clear()
+
+    @timed('filter_indices')
+    def filter_indices(self, df, filters, indexes=None, text=None, progress=None):
+        wanted = frozenset(_filter_key(f) for f in filters)
+        if not wanted:
+            return np.arange(len(df))
+        with self._lock:
+            self._bind(df)
+            if wanted in self._results:
+                self._results.move_to_end(wanted)
+                return self._results[wanted]
+
+            # Repartir du sous-ensemble déjà calculé qui retient le moins de lignes
+            base_key, positions = frozenset(), None
+            for key, cached in self._results.items():
+                if key <= wanted and (positions is None or len(cached) < len(positions)):
+                    base_key, positions = key, cached
+
+        remaining = [f for f in (_filter_key(f) for f in filters) if f not in base_key]
+        done = set(base_key)
+        for f in compile_filters(df, list(dict.fromkeys(remaining))):
+            positions = evaluate(df, [f], positions, indexes, text, progress=progress)
+            done.add(f)
+            self._store(df, frozenset(done), positions)
+        return positions
+
+    def apply(self, df, filters, indexes=None, text=None, progress=None):
+        if not filters:
+            return df.copy(deep=False)
+        return df.take(self.filter_indices(df, filters, indexes, text, progress))
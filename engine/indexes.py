@@ -0,0 +1,171 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.filters import convert_value
+from engine.ingestion import get_cache
+
+# Au-delà de ce nombre de valeurs distinctes, une colonne n'a pas d'index bitmap
+BITMAP_MAX_CARDINALITY = 64
+
+# Conditions pouvant être servies par un index
+INDEXED_CONDITIONS = ('equals', 'greater_than', 'less_than', 'between')
+
+
+# Index de hachage : valeur -> positions des lignes (pour 'equals')
+class HashIndex:
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        valid = codes >= 0
+        self._order = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._codes = {value: i for i, value in enumerate(uniques)}
+
+    def equals(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self._order[self._offsets[code]:self._offsets[code + 1]]
+
+
+# Index trié (searchsorted) : pour 'greater_than', 'less_than' et 'between'
+class SortedIndex:
+    def __init__(self, series):
+        valid = series.notna().to_numpy()
+        values = series.to_numpy()[valid]
+        order = np.argsort(values, kind='stable')
+        self._positions = np.flatnonzero(valid)[order]
+        self._values = values[order]
+
+    def _slice(self, lo, hi):
+        return np.sort(self._positions[lo:hi])
+
+    def greater_than(self, value):
+        return self._slice(np.searchsorted(self._values, value, side='right'), len(self._values))
+
+    def less_than(self, value):
+        return self._slice(0, np.searchsorted(self._values, value, side='left'))
+
+    def between(self, min_value, max_value):
+        lo = np.searchsorted(self._values, min_value, side='left')
+        hi = np.searchsorted(self._values, max_value, side='right')
+        return self._slice(lo, max(lo, hi))
+
+
+# Index bitmap : un ensemble de bits compacté par valeur distincte (colonnes à faible cardinalité)
+class BitmapIndex:
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self._size = len(series)
+        self._values = list(uniques)
+        self._bitmaps = [np.packbits(codes == i) for i in range(len(uniques))]
+
+    def _positions(self, bits):
+        return np.flatnonzero(np.unpackbits(bits, count=self._size))
+
+    def equals(self, value):
+        for candidate, bits in zip(self._values, self._bitmaps):
+            if candidate == value:
+                return self._positions(bits)
+        return np.empty(0, dtype=np.int64)
+
+    # Union des bitmaps des valeurs qui vérifient une condition
+    def matching(self, predicate):
+        combined = np.zeros_like(self._bitmaps[0]) if self._bitmaps else np.zeros(0, dtype=np.uint8)
+        for candidate, bits in zip(self._values, self._bitmaps):
+            if predicate(candidate):
+                combined |= bits
+        return self._positions(combined)
+
+
+# Index d'un dataset, construits à la demande colonne par colonne
+class DatasetIndexes:
+    def __init__(self, df):
+        self.df = df
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, item):
+        return item in self._indexes
+
+    def _get(self, column_name, kind):
+        key = (column_name, kind)
+        with self._lock:
+            if key not in self._indexes:
+                series = self.df[column_name]
+                try:
+                    if kind == 'bitmap':
+                        index = BitmapIndex(series)
+                    elif kind == 'hash':
+                        index = HashIndex(series)
+                    else:
+                        index = SortedIndex(series)
+                except TypeError:
+                    # Valeurs non comparables entre elles : pas d'index possible
+                    index = None
+                self._indexes[key] = index
+            return self._indexes[key]
+
+    def _is_low_cardinality(self, column_name):
+        key = (column_name, 'cardinality')
+        with self._lock:
+            if key not in self._indexes:
+                series = self.df[column_name]
+                self._indexes[key] = series.nunique(dropna=True) <= BITMAP_MAX_CARDINALITY
+            return self._indexes[key]
+
+    # Positions des lignes qui vérifient la condition, ou None si aucun index ne s'applique
+    def lookup(self, column_name, condition, value):
+        if condition not in INDEXED_CONDITIONS:
+            return None
+        series = self.df[column_name]
+        if isinstance(series.dtype, pd.CategoricalDtype) and condition != 'equals':
+            return None
+        col_dtype = series.dtype
+        if condition == 'between':
+            value = tuple(convert_value(v, col_dtype) for v in value)
+        else:
+            value = convert_value(value, col_dtype)
+
+        if self._is_low_cardinality(column_name):
+            index = self._get(column_name, 'bitmap')
+            if index is None:
+                return None
+            if condition == 'equals':
+                return index.equals(value)
+            predicates = {
+                'greater_than': lambda v: v > value,
+                'less_than': lambda v: v < value,
+                'between': lambda v: value[0] <= v <= value[1],
+            }
+            try:
+                return index.matching(predicates[condition])
+            except TypeError:
+                return None
+
+        if condition == 'equals':
+            index = self._get(column_name, 'hash')
+            return None if index is None else index.equals(value)
+        index = self._get(column_name, 'sorted')
+        if index is None:
+            return None
+        try:
+            if condition == 'between':
+                return index.between(*value)
+            return getattr(index, condition)(value)
+        except TypeError:
+            return None
+
+
+# Fonction pour obtenir les index d'un dataset chargé : ils sont gardés avec
+# le DataFrame dans le cache d'ingestion et partagés par toutes les sessions
+def indexes_for(key, df):
+    extras = get_cache().extras(key)
+    if extras is None:
+        return DatasetIndexes(df)
+    indexes = extras.get('indexes')
+    if indexes is None or indexes.df is not df:
+        indexes = extras['indexes'] = DatasetIndexes(df)
+    return indexes
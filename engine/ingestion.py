@@ -0,0 +1,277 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from engine.dtypes import memory_report, optimize_dtypes
+from engine.perf import stage, timed
+from engine.store import STORE_ENABLED, get_store
+
+# Formats de fichiers pris en charge
+SUPPORTED_FORMATS = ('json', 'csv', 'parquet')
+
+# Mémoire maximale occupée par les DataFrames en cache (tous utilisateurs confondus)
+CACHE_MAX_BYTES = int(os.environ.get('DATASET_APP_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Clé des informations de chargement dans les métadonnées des fichiers du magasin
+LOAD_INFO_METADATA = 'dataset_app_load_info'
+
+
+# Cache LRU de DataFrames, borné par la mémoire qu'ils occupent
+class DataFrameCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._extras = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def get(self, key):
+        with self._lock:
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+            return df
+
+    # Données annexes (index, statistiques...) gardées avec le DataFrame et évincées avec lui
+    def extras(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            return self._extras.setdefault(key, {})
+
+    def put(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._sizes.pop(key)
+                self._extras.pop(key, None)
+                del self._entries[key]
+            self._entries[key] = df
+            self._sizes[key] = size
+            self._total += size
+            # Évincer les entrées les moins récemment utilisées, en gardant toujours la dernière
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total -= self._sizes.pop(old_key)
+                self._extras.pop(old_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._extras.clear()
+            self._total = 0
+
+
+# Cache partagé par toutes les sessions du processus
+_cache = DataFrameCache()
+
+# Empreintes déjà calculées, indexées par identifiant d'upload
+_fingerprints = OrderedDict()
+_fingerprints_lock = threading.Lock()
+_FINGERPRINTS_MAX = 256
+
+
+def get_cache():
+    return _cache
+
+
+# Fonction pour déterminer le format d'un fichier à partir de son nom
+def file_format(file):
+    name = getattr(file, 'name', '') or ''
+    for fmt in SUPPORTED_FORMATS:
+        if name.endswith('.' + fmt):
+            return fmt
+    return None
+
+
+# Fonction pour lire le contenu brut d'un fichier sans déplacer sa position
+def file_bytes(file):
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    position = file.tell()
+    file.seek(0)
+    data = file.read()
+    file.seek(position)
+    return data
+
+
+# Fonction pour calculer l'empreinte du contenu d'un fichier
+def file_fingerprint(file):
+    fmt = file_format(file)
+    # Un upload Streamlit garde le même file_id tant qu'il n'est pas remplacé :
+    # on évite ainsi de re-hacher tout le fichier à chaque rerun
+    upload_id = getattr(file, 'file_id', None)
+    memo_key = (upload_id, getattr(file, 'name', None), getattr(file, 'size', None))
+    if upload_id is not None:
+        with _fingerprints_lock:
+            if memo_key in _fingerprints:
+                _fingerprints.move_to_end(memo_key)
+                return _fingerprints[memo_key]
+    digest = hashlib.blake2b(file_bytes(file), digest_size=16).hexdigest()
+    fingerprint = f'{fmt}:{digest}'
+    if upload_id is not None:
+        with _fingerprints_lock:
+            _fingerprints[memo_key] = fingerprint
+            while len(_fingerprints) > _FINGERPRINTS_MAX:
+                _fingerprints.popitem(last=False)
+    return fingerprint
+
+
+# Fonction pour parser un fichier sans passer par le cache
+def parse_file(file, fmt=None):
+    fmt = fmt or file_format(file)
+    buffer = io.BytesIO(file_bytes(file))
+    if fmt == 'json':
+        data = json.load(buffer)
+        return pd.DataFrame(data)
+    elif fmt == 'csv':
+        return pd.read_csv(buffer)
+    elif fmt == 'parquet':
+        return pd.read_parquet(buffer)
+    raise ValueError("Format de fichier non pris en charge!")
+
+
+# Fonction pour obtenir la clé de cache d'un fichier selon le mode de lecture.
+# Les colonnes et filtres poussés dans la lecture ne concernent que Parquet.
+def dataset_key(file, streaming=False, compact=False, columns=None, filters=None):
+    key = file_fingerprint(file)
+    if streaming:
+        key += '|stream'
+    if compact:
+        key += '|compact'
+    if file_format(file) == 'parquet':
+        if columns is not None:
+            key += f'|columns:{list(columns)}'
+        if filters:
+            key += f'|pushdown:{sorted(repr((c, cond, tuple(v) if isinstance(v, list) else v)) for c, cond, v in filters)}'
+    return key
+
+
+# Fonction pour lire les fichiers : un même contenu n'est parsé qu'une seule fois.
+# En mode streaming, le fichier est lu par morceaux (voir engine.streaming).
+# En mode compact, les types des colonnes sont réduits (voir engine.dtypes).
+# Pour Parquet, columns et filters limitent la lecture aux colonnes et groupes de
+# lignes utiles (voir engine.parquet).
+# Le DataFrame est ensuite écrit dans le magasin partagé (voir engine.store) et
+# relu par projection en mémoire ; après une éviction du cache, il est relu depuis
+# le magasin sans être parsé de nouveau.
+# Le DataFrame renvoyé est partagé : il ne doit pas être modifié en place.
+# progress suit la lecture par morceaux (voir engine.streaming et engine.jobs).
+@timed('load_file')
+def load_file(file, streaming=False, compact=False, columns=None, filters=None, progress=None):
+    fmt = file_format(file)
+    if fmt is None:
+        raise ValueError("Format de fichier non pris en charge!")
+    key = dataset_key(file, streaming, compact, columns, filters)
+    df = _cache.get(key)
+    if df is None and STORE_ENABLED:
+        df = get_store().read(key)
+        if df is not None:
+            _cache.put(key, df)
+            _restore_load_info(key)
+    if df is None:
+        scan = None
+        with stage('parse', format=fmt, streaming=streaming) as info:
+            if fmt == 'parquet' and (columns is not None or filters):
+                from engine.parquet import read_parquet
+                df, scan = read_parquet(file, columns, filters)
+            elif streaming:
+                from engine.streaming import load_streaming
+                df = load_streaming(file, fmt, progress=progress)
+            else:
+                df = parse_file(file, fmt)
+            info['rows'] = len(df)
+        report = None
+        if compact:
+            with stage('optimize_dtypes'):
+                optimized = optimize_dtypes(df)
+                report = memory_report(df, optimized)
+                df = optimized
+        info = {}
+        if report is not None:
+            info['memory_report'] = report.to_dict(orient='list')
+        if scan is not None:
+            info['parquet_scan'] = scan
+        if STORE_ENABLED:
+            with stage('store_write'):
+                metadata = {LOAD_INFO_METADATA: json.dumps(info)} if info else None
+                if get_store().write(key, df, metadata):
+                    df = get_store().read(key)
+        _cache.put(key, df)
+        _set_load_info(key, info)
+    return df
+
+
+# Informations de chargement (rapport mémoire, lecture Parquet partielle) : gardées avec
+# le DataFrame dans le cache et, en JSON, dans les métadonnées de son fichier du magasin,
+# pour les retrouver quand il y est relu après une éviction du cache
+def _set_load_info(key, info):
+    extras = _cache.extras(key)
+    if extras is None:
+        return
+    if 'memory_report' in info:
+        extras['memory_report'] = pd.DataFrame(info['memory_report'])
+    if 'parquet_scan' in info:
+        extras['parquet_scan'] = info['parquet_scan']
+
+
+def _restore_load_info(key):
+    value = get_store().metadata(key, LOAD_INFO_METADATA)
+    if value is not None:
+        _set_load_info(key, json.loads(value))
+
+
+# Fonction pour savoir si un dataset est déjà chargé (en mémoire ou dans le magasin)
+def dataset_loaded(key):
+    return key in _cache or (STORE_ENABLED and key in get_store())
+
+
+# Fonction pour ouvrir une poignée sur un dataset chargé (None s'il n'est pas dans le magasin).
+# La poignée protège le fichier de l'éviction tant que la session la garde.
+def dataset_handle(key):
+    if not STORE_ENABLED:
+        return None
+    return get_store().open(key)
+
+
+# Fonction pour obtenir le fichier sur disque d'un dataset chargé et son format
+# (pour les moteurs de requête hors mémoire, voir engine.backends), ou (None, None)
+def dataset_source(key):
+    if not STORE_ENABLED or key not in get_store():
+        return None, None
+    return get_store().path(key), 'ipc'
+
+
+# Fonction pour obtenir le rapport mémoire par colonne d'un dataset chargé en mode compact
+def dataset_memory_report(key):
+    extras = _cache.extras(key)
+    if extras is None:
+        return None
+    return extras.get('memory_report')
+
+
+# Fonction pour obtenir le résumé de la dernière lecture Parquet partielle d'un dataset
+def dataset_parquet_scan(key):
+    extras = _cache.extras(key)
+    if extras is None:
+        return None
+    return extras.get('parquet_scan')
@@ -0,0 +1,144 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.perf import stage, start_run
+
+# Nombre de tâches de fond exécutées en même temps
+JOB_WORKERS = int(os.environ.get('DATASET_APP_JOB_WORKERS', 2))
+
+# Nombre de tâches terminées gardées (avec leur résultat) pour les reruns et les autres sessions
+JOB_HISTORY = 16
+
+# Taille de fichier à partir de laquelle un chargement passe en tâche de fond
+BACKGROUND_MIN_BYTES = 50 * 1024 ** 2
+
+# Nombre de lignes à partir duquel un filtrage ou un export passe en tâche de fond
+BACKGROUND_MIN_ROWS = 500_000
+
+# États d'une tâche
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+
+
+# Exception levée dans une tâche dont l'annulation a été demandée
+class JobCancelled(Exception):
+    pass
+
+
+# Tâche de fond : la fonction reçoit un rappel progress(fait, total), qui sert aussi de
+# point d'annulation (total peut valoir None quand la quantité de travail est inconnue).
+# Une tâche qui n'appelle jamais progress (lecture en un bloc, agrégation...) ne peut
+# pas être annulée : cancellable ne devient vrai qu'au premier appel.
+class Job:
+    def __init__(self, key, func):
+        self.key = key
+        self.func = func
+        self.status = PENDING
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        # Mesures de la tâche exécutée en fond (voir engine.perf)
+        self.perf = None
+        self.cancellable = False
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    # Avancement entre 0 et 1 (None s'il est inconnu)
+    @property
+    def fraction(self):
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+    def progress(self, done, total=None):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.cancellable = True
+        self.done = done
+        self.total = total
+
+    # L'annulation est prise en compte au prochain appel de progress
+    def cancel(self):
+        self._cancel.set()
+        if self.status == PENDING:
+            self.status = CANCELLED
+
+    def run(self):
+        if self._cancel.is_set():
+            self.status = CANCELLED
+            return
+        self.status = RUNNING
+        try:
+            self.result = self.func(self.progress)
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        else:
+            self.status = DONE
+        finally:
+            self.func = None
+
+
+# Exécuteur de tâches de fond partagé par les sessions : une tâche est identifiée par une
+# clé, et une seconde demande avec la même clé reçoit la tâche déjà lancée (ou terminée).
+# Une tâche échouée ou annulée est relancée à la demande suivante.
+class JobRunner:
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.history = history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='dataset-job')
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    # Avec background=False, la tâche est exécutée tout de suite dans le fil appelant
+    # (travail court) : elle est suivie et gardée en cache comme les autres
+    def submit(self, key, func, background=True):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status not in (FAILED, CANCELLED):
+                self._jobs.move_to_end(key)
+                return job
+            self._jobs.pop(key, None)
+            job = self._jobs[key] = Job(key, func)
+            self._forget_finished()
+        if background:
+            self._executor.submit(self._run_background, job)
+        else:
+            job.run()
+        return job
+
+    # Une tâche de fond a ses propres mesures, rattachées au rerun qui reçoit son résultat
+    def _run_background(self, job):
+        kind = job.key[0] if isinstance(job.key, tuple) else job.key
+        job.perf = start_run(f'job:{kind}')
+        with stage('job', kind=kind):
+            job.run()
+
+    # Les tâches terminées les plus anciennes sont oubliées ; celles en cours sont gardées
+    def _forget_finished(self):
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[key]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+# Exécuteur partagé par toutes les sessions du processus
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Nombre de travailleurs (tous les cœurs par défaut)
+WORKERS = int(os.environ.get('DATASET_APP_WORKERS', os.cpu_count() or 1))
+
+# En dessous de ce nombre de lignes, le découpage coûte plus qu'il ne rapporte
+PARALLEL_MIN_ROWS = 500_000
+
+# Taille visée des partitions de lignes (plus de partitions que de travailleurs,
+# pour équilibrer la charge et faire avancer la barre de progression)
+PARTITION_ROWS = 250_000
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Fonction pour savoir si une opération sur n_rows lignes vaut la peine d'être parallélisée
+def use_parallel(n_rows, workers=None):
+    return (workers or WORKERS) > 1 and n_rows >= PARALLEL_MIN_ROWS
+
+
+# Fonction pour découper n_rows lignes en partitions contiguës (début, fin)
+def row_partitions(n_rows, workers=None, partition_rows=PARTITION_ROWS):
+    count = max(workers or WORKERS, -(-n_rows // partition_rows), 1)
+    size = max(-(-n_rows // count), 1)
+    return [(start, min(start + size, n_rows)) for start in range(0, n_rows, size)]
+
+
+# Fonction pour démarrer tous les processus d'un pool dès sa création. 'spawn' relance
+# le module __main__ dans chaque processus, et Streamlit y place le script de la page :
+# un module vide le remplace le temps du démarrage, pour que la page ne soit pas réexécutée.
+def _start_processes(workers):
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        # Les tâches sont soumises avant que le premier processus soit prêt :
+        # chacune en démarre un nouveau
+        started = [pool.submit(os.getpid) for _ in range(workers)]
+    finally:
+        sys.modules['__main__'] = main
+    for future in started:
+        future.result()
+    return pool
+
+
+# Pools partagés par tout le processus. Les fils conviennent au code numpy/Arrow,
+# qui libère le GIL ; les processus (démarrés avec 'spawn', sûr dans un serveur
+# multi-fils) servent au code pandas qui le garde, comme la sérialisation CSV/JSON.
+def _pool(processes, workers):
+    key = (processes, workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if processes:
+                pool = _start_processes(workers)
+            else:
+                pool = ThreadPoolExecutor(workers, thread_name_prefix='dataset-worker')
+            _pools[key] = pool
+        return pool
+
+
+def _discard_pool(processes, workers):
+    with _pools_lock:
+        pool = _pools.pop((processes, workers), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Fonction pour appliquer func à chaque élément sur le pool, en renvoyant les résultats
+# dans l'ordre des éléments. Au plus deux tâches par travailleur sont en attente, ce
+# qui borne la mémoire quand les résultats sont volumineux (morceaux d'export).
+# progress(fait, total) est appelé depuis le fil appelant (celui du script Streamlit).
+def imap_ordered(func, items, workers=None, processes=False, progress=None, total=None):
+    workers = workers or WORKERS
+    items = iter(items)
+    done = 0
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+            done += 1
+            if progress is not None:
+                progress(done, total or done)
+        return
+
+    pool = _pool(processes, workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+                done += 1
+                if progress is not None:
+                    progress(done, total or done + len(pending))
+        while pending:
+            yield pending.popleft().result()
+            done += 1
+            if progress is not None:
+                progress(done, total or done + len(pending))
+    except BrokenProcessPool:
+        # Un processus a été tué (mémoire...) : le pool est recréé au prochain appel
+        _discard_pool(processes, workers)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
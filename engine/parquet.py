@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from engine.backends import UnsupportedQuery, arrow_expression, check_filters
+from engine.filters import apply_filters
+from engine.ingestion import file_bytes
+
+# Colonne ajoutée pendant la lecture pour retrouver la position des lignes
+POSITION_COLUMN = '__position__'
+
+
+# Fonction pour obtenir le contenu d'un fichier Parquet (chemin, ou octets d'un upload sans copie)
+def _parquet_data(file):
+    if isinstance(file, str):
+        return file
+    return pa.py_buffer(file_bytes(file))
+
+
+# Fonction pour ouvrir une source Parquet (chaque lecteur a sa propre position)
+def _open(data):
+    return data if isinstance(data, str) else pa.BufferReader(data)
+
+
+def _data_columns(schema):
+    index_columns = [col for col in (schema.pandas_metadata or {}).get('index_columns', []) if isinstance(col, str)]
+    return [name for name in schema.names if name not in index_columns]
+
+
+# Fonction pour lister les colonnes d'un fichier Parquet en ne lisant que son pied de page
+def parquet_columns(file):
+    return _data_columns(pq.ParquetFile(_open(_parquet_data(file))).schema_arrow)
+
+
+# Fonction pour lire dans le pied de page d'un fichier Parquet les statistiques de chaque
+# colonne : min, max et nombre de valeurs manquantes, agrégés sur les groupes de lignes.
+# Une colonne n'y figure que si tous ses groupes de lignes ont ces statistiques. Le min/max
+# des colonnes texte n'est pas repris : certains outils l'écrivent tronqué.
+def parquet_statistics(file):
+    parquet_file = pq.ParquetFile(_open(_parquet_data(file)))
+    metadata = parquet_file.metadata
+    names = set(_data_columns(parquet_file.schema_arrow))
+    result = {}
+    for i in range(metadata.num_columns):
+        column = metadata.schema.column(i)
+        name = column.path
+        if name not in names:
+            continue
+        text = column.physical_type in ('BYTE_ARRAY', 'FIXED_LEN_BYTE_ARRAY')
+        bounds, nulls = [], 0
+        for rg in range(metadata.num_row_groups):
+            statistics = metadata.row_group(rg).column(i).statistics
+            if statistics is None or not statistics.has_null_count:
+                break
+            nulls += statistics.null_count
+            if statistics.has_min_max:
+                bounds.append((statistics.min, statistics.max))
+            elif statistics.num_values:
+                break
+        else:
+            known = {'nulls': nulls}
+            if bounds and not text:
+                try:
+                    known['min'] = min(low for low, _ in bounds)
+                    known['max'] = max(high for _, high in bounds)
+                except TypeError:
+                    pass
+            result[name] = known
+    return result
+
+
+# Fonction pour séparer les filtres qu'Arrow sait évaluer pendant la lecture des autres
+def _split_filters(schema, filters):
+    pushed, remaining = [], []
+    for f in filters:
+        try:
+            arrow_expression(schema, [f])
+        except UnsupportedQuery:
+            remaining.append(f)
+        else:
+            pushed.append(f)
+    return pushed, remaining
+
+
+# Fonction pour lire un fichier Parquet en ne lisant que le nécessaire :
+# - seules les colonnes demandées et celles des filtres sont lues (projection) ;
+# - les groupes de lignes dont les statistiques (min/max) excluent les filtres sont sautés ;
+# - les filtres sont évalués par Arrow sur les groupes lus, les autres par pandas.
+# Les colonnes des filtres sont toujours gardées, pour pouvoir filtrer de nouveau.
+# Les lignes gardent leur position d'origine comme index. Renvoie le DataFrame et
+# un résumé de la lecture (octets et groupes de lignes lus).
+def read_parquet(file, columns=None, filters=None):
+    data = _parquet_data(file)
+    parquet_file = pq.ParquetFile(_open(data))
+    schema = parquet_file.schema_arrow
+    metadata = parquet_file.metadata
+    all_columns = _data_columns(schema)
+    filters = list(filters or [])
+    check_filters(all_columns, filters)
+
+    wanted = all_columns if columns is None else list(columns)
+    filter_columns = [column_name for column_name, _, _ in filters]
+    needed = [name for name in all_columns if name in wanted or name in filter_columns]
+
+    pushed, remaining = _split_filters(schema, filters)
+    expression = arrow_expression(schema, pushed) if pushed else None
+    row_groups = list(range(metadata.num_row_groups))
+    if expression is not None:
+        fragment = ds.ParquetFileFormat().make_fragment(_open(data))
+        kept = fragment.split_by_row_group(filter=expression, schema=schema)
+        row_groups = [row_group.row_groups[0].id for row_group in kept]
+
+    starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    table = parquet_file.read_row_groups(row_groups, columns=needed, use_pandas_metadata=True)
+    positions = np.concatenate([np.arange(starts[i], starts[i + 1]) for i in row_groups] or [np.array([], dtype=np.int64)])
+    if expression is not None:
+        table = table.append_column(POSITION_COLUMN, pa.array(positions, type=pa.int64())).filter(expression)
+        positions = table.column(POSITION_COLUMN).to_numpy()
+        table = table.drop_columns([POSITION_COLUMN])
+
+    df = table.to_pandas()
+    ranges = [col for col in (schema.pandas_metadata or {}).get('index_columns', []) if isinstance(col, dict)]
+    if ranges or not (schema.pandas_metadata or {}).get('index_columns'):
+        # Index entier par défaut : les étiquettes se déduisent des positions
+        start, step = (ranges[0]['start'], ranges[0]['step']) if ranges else (0, 1)
+        df.index = pd.Index(start + positions.astype(np.int64) * step)
+    if remaining:
+        df = apply_filters(df, remaining)
+
+    # Octets compressés lus (colonnes projetées des groupes gardés) et taille totale du fichier
+    def chunk_bytes(row_group_ids, column_names):
+        return sum(metadata.row_group(rg).column(i).total_compressed_size
+                   for rg in row_group_ids for i in range(metadata.num_columns)
+                   if metadata.schema.column(i).path.split('.')[0] in column_names)
+
+    scan = {
+        'row_groups_read': len(row_groups),
+        'row_groups_total': metadata.num_row_groups,
+        'bytes_read': chunk_bytes(row_groups, set(needed)),
+        'bytes_total': chunk_bytes(range(metadata.num_row_groups), set(schema.names)),
+    }
+    return df, scan
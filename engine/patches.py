@@ -0,0 +1,152 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from engine.ingestion import file_bytes, file_format
+
+# Noms de colonnes acceptés dans un fichier de modifications
+PATCH_COLUMNS = {
+    'row': ('row', 'ligne', 'index'),
+    'column': ('column', 'colonne'),
+    'value': ('value', 'valeur'),
+}
+
+TRUE_VALUES = {'true', 'vrai', '1', 'oui', 'yes'}
+FALSE_VALUES = {'false', 'faux', '0', 'non', 'no'}
+
+# Type de conversion des valeurs écrites dans une colonne 'object', selon son contenu
+OBJECT_TARGETS = {
+    'integer': pd.Int64Dtype(),
+    'floating': np.dtype('float64'),
+    'mixed-integer-float': np.dtype('float64'),
+    'boolean': pd.BooleanDtype(),
+}
+
+
+# Fonction pour convertir en une fois des valeurs au type d'une colonne.
+# Renvoie None si une valeur ne peut pas être représentée dans ce type.
+def coerce_values(values, dtype):
+    dtype = pd.api.types.pandas_dtype(dtype)
+    raw = pd.Series(values, dtype=object)
+    missing = raw.isna()
+    try:
+        if pd.api.types.is_bool_dtype(dtype):
+            text = raw.astype(str).str.strip().str.lower()
+            if not (text.isin(TRUE_VALUES | FALSE_VALUES) | missing).all() or missing.any():
+                return None
+            return text.isin(TRUE_VALUES).to_numpy()
+        if pd.api.types.is_integer_dtype(dtype):
+            numbers = pd.to_numeric(raw, errors='coerce')
+            if (numbers.isna() & ~missing).any() or (missing.any() and not isinstance(dtype, pd.api.extensions.ExtensionDtype)):
+                return None
+            present = numbers.dropna()
+            if (present % 1 != 0).any():
+                return None
+            limits = np.iinfo(getattr(dtype, 'numpy_dtype', dtype))
+            if len(present) and (present.min() < limits.min or present.max() > limits.max):
+                return None
+            return numbers.astype(dtype).to_numpy()
+        if pd.api.types.is_float_dtype(dtype):
+            numbers = pd.to_numeric(raw, errors='coerce')
+            if (numbers.isna() & ~missing).any():
+                return None
+            return numbers.astype(dtype).to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            dates = pd.to_datetime(raw, errors='coerce')
+            if (dates.isna() & ~missing).any():
+                return None
+            return dates.to_numpy()
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_object_dtype(dtype):
+        return raw.where(missing, raw.astype(str)).to_numpy()
+    return raw.to_numpy()
+
+
+# Fonction pour écrire des valeurs à certaines positions d'une colonne, en une seule
+# opération. Les valeurs sont converties une fois au type de la colonne ; si ce
+# n'est pas possible, la colonne passe en 'object'.
+def scatter_column(series, positions, values):
+    positions = np.asarray(positions, dtype=np.int64)
+    values = np.asarray(values, dtype=object)
+    # Pour une même ligne, la dernière modification l'emporte
+    keep = ~pd.Index(positions).duplicated(keep='last')
+    positions, values = positions[keep], values[keep]
+
+    series = series.copy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Les nouvelles valeurs deviennent des catégories supplémentaires
+        coerced = coerce_values(values, series.cat.categories.dtype)
+        if coerced is not None:
+            new = pd.Index(coerced).dropna().unique().difference(series.cat.categories)
+            if len(new):
+                series = series.cat.add_categories(new)
+    elif series.dtype == object:
+        # Colonne 'object' (par exemple numérique avec des lignes ajoutées vides) :
+        # les valeurs prennent le type des valeurs déjà présentes
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        target = OBJECT_TARGETS.get(inferred)
+        coerced = coerce_values(values, target) if target is not None else None
+        if coerced is None:
+            coerced = values
+    else:
+        coerced = coerce_values(values, series.dtype)
+        if coerced is None and pd.api.types.is_integer_dtype(series.dtype):
+            # Entiers réduits (voir engine.dtypes) : la colonne repasse sur 64 bits si besoin
+            wide = 'Int64' if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else 'int64'
+            coerced = coerce_values(values, wide)
+            if coerced is not None:
+                series = series.astype(wide)
+    if coerced is not None:
+        try:
+            series.iloc[positions] = coerced
+            return series
+        except (TypeError, ValueError):
+            pass
+    series = series.astype(object)
+    series.iloc[positions] = values
+    return series
+
+
+# Fonction pour appliquer une liste de (position de ligne, colonne, valeur) :
+# les modifications sont regroupées par colonne et appliquées colonne par colonne
+def apply_cells(df, cells):
+    by_column = {}
+    for position, column_name, value in cells:
+        by_column.setdefault(column_name, ([], []))
+        by_column[column_name][0].append(position)
+        by_column[column_name][1].append(value)
+    df = df.copy(deep=False)
+    for column_name, (positions, values) in by_column.items():
+        if column_name not in df.columns:
+            df[column_name] = None
+        df[column_name] = scatter_column(df[column_name], positions, values)
+    return df
+
+
+# Fonction pour lire un fichier de modifications (CSV ou JSON) avec les colonnes
+# ligne/row, colonne/column et valeur/value. Renvoie une liste de (ligne, colonne, valeur).
+def read_patch_file(file):
+    fmt = file_format(file)
+    buffer = io.BytesIO(file_bytes(file))
+    if fmt == 'csv':
+        # Les valeurs restent du texte : elles sont converties au type de chaque colonne
+        patch = pd.read_csv(buffer, dtype=str, keep_default_na=False)
+    elif fmt == 'json':
+        patch = pd.read_json(buffer, orient='records', dtype=False)
+    else:
+        raise ValueError("Le fichier de modifications doit être au format CSV ou JSON")
+
+    renamed = {}
+    for target, aliases in PATCH_COLUMNS.items():
+        found = [col for col in patch.columns if str(col).strip().lower() in aliases]
+        if not found:
+            raise ValueError(f"Colonne '{target}' manquante dans le fichier de modifications")
+        renamed[found[0]] = target
+    patch = patch.rename(columns=renamed)
+
+    rows = pd.to_numeric(patch['row'], errors='coerce')
+    if rows.isna().any() or (rows % 1 != 0).any() or (rows < 0).any():
+        raise ValueError("Les numéros de ligne du fichier de modifications doivent être des entiers positifs")
+    return list(zip(rows.astype(np.int64).tolist(), patch['column'].astype(str).tolist(), patch['value'].tolist()))
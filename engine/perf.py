@@ -0,0 +1,143 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+# Mesures activées (DATASET_APP_PERF=0 pour les désactiver)
+PERF_ENABLED = os.environ.get('DATASET_APP_PERF', '1') != '0'
+
+# Fichier où ajouter les mesures, une ligne JSON par étape (en plus du logger 'dataset_app.perf')
+PERF_LOG_FILE = os.environ.get('DATASET_APP_PERF_LOG')
+
+logger = logging.getLogger('dataset_app.perf')
+if PERF_LOG_FILE:
+    _handler = logging.FileHandler(PERF_LOG_FILE, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_local = threading.local()
+
+
+# Fonction pour lire la mémoire résidente du processus (None si le système ne la fournit pas)
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Mesures d'une exécution (un rerun de page, ou une tâche de fond)
+class PerfRecorder:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.records = []
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    # Ajouter les mesures d'une autre exécution (tâche de fond terminée pendant ce rerun)
+    def extend(self, other):
+        with self._lock:
+            self.records.extend(dict(record, run=other.name) for record in other.records)
+
+
+# Fonction pour commencer les mesures d'une exécution dans le fil courant
+def start_run(name):
+    recorder = PerfRecorder(name)
+    _local.recorder = recorder
+    _local.depth = 0
+    return recorder
+
+
+def current_recorder():
+    return getattr(_local, 'recorder', None)
+
+
+# Bloc mesuré : durée, variation de la mémoire résidente et de la mémoire allouée par Arrow.
+# La mesure est ajoutée à l'exécution en cours et écrite dans le log. Le bloc reçoit un
+# dictionnaire où ajouter des détails (nombre de lignes, octets produits...).
+@contextmanager
+def stage(name, **details):
+    if not PERF_ENABLED:
+        yield details
+        return
+    recorder = current_recorder()
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    rss = rss_bytes()
+    arrow = pa.total_allocated_bytes()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield details
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        _local.depth = depth
+        rss_after = rss_bytes()
+        record = {
+            'stage': name,
+            'run': recorder.name if recorder is not None else None,
+            'start': start - recorder.started if recorder is not None else None,
+            'seconds': end - start,
+            'rss_delta': rss_after - rss if rss is not None and rss_after is not None else None,
+            'arrow_delta': pa.total_allocated_bytes() - arrow,
+            'depth': depth,
+            'thread': threading.current_thread().name,
+            **details,
+        }
+        if error is not None:
+            record['error'] = error
+        if recorder is not None:
+            recorder.add(record)
+        logger.info(json.dumps(record, default=str))
+
+
+# Décorateur pour mesurer chaque appel d'une fonction
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Tableau des mesures d'une exécution, dans l'ordre où les étapes ont commencé
+def perf_table(recorder):
+    columns = ['Étape', 'Durée (ms)', 'Mémoire (Mo)', 'Arrow (Mo)', 'Détails']
+    fixed = {'stage', 'run', 'start', 'seconds', 'rss_delta', 'arrow_delta', 'depth', 'thread', 'error'}
+    rows = []
+    for record in sorted(recorder.records, key=lambda r: (r['run'] != recorder.name, r['start'] or 0)):
+        label = '  ' * record['depth'] + record['stage']
+        if record['run'] != recorder.name:
+            label = f"{label} [{record['run']}]"
+        details = ', '.join(f'{k}={v}' for k, v in record.items() if k not in fixed)
+        if record.get('error'):
+            details = f"{details}, erreur={record['error']}" if details else f"erreur={record['error']}"
+        rows.append([
+            label,
+            round(record['seconds'] * 1000, 1),
+            None if record['rss_delta'] is None else round(record['rss_delta'] / 1024 ** 2, 1),
+            round(record['arrow_delta'] / 1024 ** 2, 1),
+            details,
+        ])
+    return pd.DataFrame(rows, columns=columns)
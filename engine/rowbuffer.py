@@ -0,0 +1,55 @@
+import pandas as pd
+
+
+# Tampon de lignes optimisé pour l'ajout : une liste extensible par colonne.
+# Ajouter une ligne coûte O(1) ; le DataFrame n'est construit que pour l'affichage
+# ou l'export, puis gardé tant que le tampon ne change pas.
+class RowBuffer:
+    def __init__(self, columns=()):
+        self._columns = {}
+        self._length = 0
+        self._frame = None
+        for name in columns:
+            self.add_column(name)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def add_column(self, name):
+        if name in self._columns:
+            return
+        self._columns[name] = [None] * self._length
+        self._frame = None
+
+    # Ajoute une ligne (dictionnaire colonne -> valeur) ; les colonnes absentes restent vides
+    def append(self, row):
+        for name in row:
+            self.add_column(name)
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        self._length += 1
+        self._frame = None
+
+    # Ajoute en une fois toutes les lignes d'un DataFrame
+    def extend_frame(self, df):
+        if df.empty:
+            return
+        for name in df.columns:
+            self.add_column(name)
+        count = len(df)
+        for name, values in self._columns.items():
+            if name in df.columns:
+                values.extend(df[name].tolist())
+            else:
+                values.extend([None] * count)
+        self._length += count
+        self._frame = None
+
+    def to_frame(self):
+        if self._frame is None:
+            self._frame = pd.DataFrame(self._columns, columns=list(self._columns))
+        return self._frame
@@ -0,0 +1,170 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from engine.ingestion import get_cache
+
+# Caractères qui font d'une valeur recherchée une expression régulière
+REGEX_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+# Nombre de valeurs distinctes à partir duquel une colonne a un index de trigrammes
+# (None pour ne jamais en construire)
+TRIGRAM_MIN_UNIQUES = 500_000
+
+# Nombre de recherches récentes gardées en mémoire par colonne
+QUERY_CACHE_SIZE = 16
+
+
+# Fonction pour savoir si une valeur recherchée doit être traitée comme une regex
+def is_regex(value):
+    return bool(REGEX_CHARACTERS.intersection(value))
+
+
+# Index de trigrammes : trigramme -> codes des valeurs distinctes qui le contiennent.
+# Les listes de codes sont rangées bout à bout (offsets) et construites de façon vectorisée.
+class TrigramIndex:
+    def __init__(self, values):
+        lengths = pc.utf8_length(values).to_numpy(zero_copy_only=False)
+        grams, owners = [], []
+        for start in range(int(lengths.max(initial=0)) - 2):
+            selected = np.flatnonzero(lengths >= start + 3)
+            grams.append(pc.utf8_slice_codeunits(values.take(selected), start, start + 3))
+            owners.append(selected)
+        if not grams:
+            self._grams = {}
+            self._codes = np.empty(0, dtype=np.int64)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            return
+        encoded = pc.dictionary_encode(pa.chunked_array(grams)).combine_chunks()
+        gram_ids = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        gram_values = encoded.dictionary.to_pylist()
+        # Une paire (trigramme, code) par occurrence, triée par trigramme puis dédoublonnée
+        pairs = np.sort(gram_ids * len(values) + np.concatenate(owners))
+        keep = np.ones(len(pairs), dtype=bool)
+        np.not_equal(pairs[1:], pairs[:-1], out=keep[1:])
+        pairs = pairs[keep]
+        pair_grams = pairs // len(values)
+        self._codes = pairs % len(values)
+        self._offsets = np.searchsorted(pair_grams, np.arange(len(gram_values) + 1))
+        self._grams = {gram: i for i, gram in enumerate(gram_values)}
+
+    def _postings(self, gram):
+        gram_id = self._grams.get(gram)
+        if gram_id is None:
+            return None
+        return self._codes[self._offsets[gram_id]:self._offsets[gram_id + 1]]
+
+    # Codes candidats contenant tous les trigrammes de la valeur (None si elle est trop courte)
+    def candidates(self, value):
+        grams = {value[i:i + 3] for i in range(len(value) - 2)}
+        if not grams:
+            return None
+        lists = [self._postings(gram) for gram in grams]
+        if any(codes is None for codes in lists):
+            return np.empty(0, dtype=np.int64)
+        lists.sort(key=len)
+        result = lists[0]
+        for codes in lists[1:]:
+            result = np.intersect1d(result, codes, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+
+# Colonne convertie une seule fois en texte : chaque valeur distincte n'est convertie
+# et testée qu'une fois, puis le résultat est propagé aux lignes par leur code
+class TextColumn:
+    def __init__(self, series, trigram_min_uniques=TRIGRAM_MIN_UNIQUES):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self.codes = codes
+        self.values = pa.array(np.asarray(pd.Index(uniques).astype(str), dtype=object), type=pa.string())
+        self._trigram_min_uniques = trigram_min_uniques
+        self._trigrams = None
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _trigram_index(self):
+        if self._trigram_min_uniques is None or len(self.values) < self._trigram_min_uniques:
+            return None
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(self.values)
+        return self._trigrams
+
+    # Fonction pour tester les valeurs distinctes, renvoie un masque sur les codes
+    def _match_uniques(self, value):
+        if is_regex(value):
+            try:
+                matched = pc.match_substring_regex(self.values, value)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # Syntaxe non prise en charge par Arrow (RE2) : on passe par le module re
+                pattern = re.compile(value)
+                return np.fromiter((pattern.search(s) is not None for s in self.values.to_pylist()),
+                                   dtype=bool, count=len(self.values))
+            return matched.to_numpy(zero_copy_only=False)
+
+        trigrams = self._trigram_index()
+        candidates = trigrams.candidates(value) if trigrams is not None else None
+        if candidates is None:
+            return pc.match_substring(self.values, value).to_numpy(zero_copy_only=False)
+        hit = np.zeros(len(self.values), dtype=bool)
+        if len(candidates):
+            verified = pc.match_substring(self.values.take(candidates), value).to_numpy(zero_copy_only=False)
+            hit[candidates[verified]] = True
+        return hit
+
+    def _hits(self, value):
+        with self._lock:
+            if value in self._queries:
+                self._queries.move_to_end(value)
+                return self._queries[value]
+            # La dernière case (fausse) sert aux valeurs manquantes, de code -1
+            hit = np.append(self._match_uniques(value), False)
+            self._queries[value] = hit
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+            return hit
+
+    # Masque des lignes contenant la valeur (éventuellement restreint à certaines positions)
+    def contains(self, value, positions=None):
+        hit = self._hits(value)
+        if positions is None:
+            return hit[self.codes]
+        return hit[self.codes[positions]]
+
+
+# Fonction pour tester 'contains' sur une colonne sans rien garder en cache
+def contains_mask(series, value):
+    return TextColumn(series, trigram_min_uniques=None).contains(value)
+
+
+# Colonnes texte d'un dataset, converties à la demande
+class DatasetTextSearch:
+    def __init__(self, df):
+        self.df = df
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def column(self, column_name):
+        with self._lock:
+            if column_name not in self._columns:
+                self._columns[column_name] = TextColumn(self.df[column_name])
+            return self._columns[column_name]
+
+    def contains(self, column_name, value, positions=None):
+        return self.column(column_name).contains(value, positions)
+
+
+# Fonction pour obtenir la recherche texte d'un dataset chargé, gardée dans le cache d'ingestion
+def text_search_for(key, df):
+    extras = get_cache().extras(key)
+    if extras is None:
+        return DatasetTextSearch(df)
+    search = extras.get('text')
+    if search is None or search.df is not df:
+        search = extras['text'] = DatasetTextSearch(df)
+    return search
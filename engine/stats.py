@@ -0,0 +1,244 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from engine.ingestion import get_cache
+from engine.perf import stage
+
+# Précision du HyperLogLog : 2**14 registres, erreur relative d'environ 0,8 %
+HLL_PRECISION = 14
+
+# En dessous de ce nombre de lignes, les valeurs distinctes sont comptées exactement
+EXACT_DISTINCT_ROWS = 100_000
+
+# Nombre de valeurs les plus fréquentes gardées
+TOP_K = 10
+
+# Au-delà de ce nombre de valeurs distinctes (estimé), une colonne numérique ou de dates
+# n'a pas de valeurs les plus fréquentes : son histogramme la décrit
+TOP_K_MAX_DISTINCT = 100_000
+
+# Nombre de classes des histogrammes
+HISTOGRAM_BINS = 20
+
+
+# Fonction pour calculer le nombre de bits significatifs de chaque entier (vectorisé, exact)
+def _bit_length(values):
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= (np.uint64(1) << np.uint64(shift))
+        length[high] += shift
+        values[high] >>= np.uint64(shift)
+    length[values > 0] += 1
+    return length
+
+
+# Estimateur HyperLogLog du nombre de valeurs distinctes, à partir de hachages 64 bits
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        buckets = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        rest = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        # Rang du premier bit à 1 dans les 64 - p bits restants
+        ranks = ((64 - self.precision) - _bit_length(rest).astype(np.int16) + 1).astype(np.uint8)
+        # Maximum par registre : une affectation indexée ne garantit pas l'ordre des
+        # écritures en double, ufunc.at si
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Petites cardinalités : comptage linéaire des registres vides
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+# Fonction pour convertir une valeur numpy/pandas en valeur Python simple (affichage, JSON)
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# Fonction pour obtenir les valeurs les plus fréquentes : liste de (valeur, compte),
+# et le nombre exact de valeurs distinctes
+def _top_values(values, k=TOP_K):
+    counts = values.value_counts(sort=True, dropna=True)
+    return [(_plain(value), int(count)) for value, count in counts.head(k).items()], len(counts)
+
+
+# Fonction pour compter les valeurs d'une colonne texte avec Arrow (une table de hachage
+# en C++) : nombre exact de valeurs distinctes et valeurs les plus fréquentes.
+# Renvoie None si la colonne ne se convertit pas en Arrow (types mélangés).
+def _text_counts(values, k=TOP_K):
+    try:
+        array = pa.array(values, from_pandas=True)
+        counts = pc.value_counts(array)
+        bounds = pc.min_max(array)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    frequencies = counts.field('counts')
+    order = pc.select_k_unstable(frequencies, k, [('dummy', 'descending')])
+    top = zip(counts.field('values').take(order).to_pylist(), frequencies.take(order).to_pylist())
+    return {
+        'distinct': len(counts),
+        'top': list(top),
+        'min': bounds['min'].as_py(),
+        'max': bounds['max'].as_py(),
+    }
+
+
+# Fonction pour calculer l'histogramme d'une colonne numérique ou de dates
+def _histogram(values, bins=HISTOGRAM_BINS):
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        numbers = values.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    else:
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        numbers = numbers[np.isfinite(numbers)]
+    if not len(numbers):
+        return None
+    counts, edges = np.histogram(numbers, bins=bins)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        edges = pd.to_datetime(edges.astype(np.int64)).tolist()
+    else:
+        edges = edges.tolist()
+    return {'counts': counts.tolist(), 'edges': edges}
+
+
+# Fonction pour calculer les statistiques d'une colonne en un passage vectorisé :
+# valeurs manquantes, min/max, valeurs distinctes (exactes ou HyperLogLog), valeurs
+# les plus fréquentes et histogramme. known peut fournir min, max et nulls déjà
+# connus (statistiques d'un fichier Parquet) : ils ne sont alors pas recalculés.
+def column_stats(series, known=None):
+    known = known or {}
+    dtype = series.dtype
+    rows = len(series)
+    if 'nulls' in known:
+        nulls = int(known['nulls'])
+    else:
+        nulls = int(series.isna().sum())
+    stats = {
+        'dtype': str(dtype),
+        'rows': rows,
+        'nulls': nulls,
+        'min': None,
+        'max': None,
+        'distinct': 0,
+        'distinct_exact': True,
+        'top': [],
+        'histogram': None,
+        'source': 'parquet' if known else 'data',
+    }
+    values = series.dropna() if nulls else series
+    if not len(values):
+        return stats
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Les comptes par catégorie suffisent : distinctes et plus fréquentes exactes
+        counts = np.bincount(values.cat.codes.to_numpy(), minlength=len(dtype.categories))
+        present = np.flatnonzero(counts)
+        stats['distinct'] = len(present)
+        order = present[np.argsort(-counts[present], kind='stable')][:TOP_K]
+        stats['top'] = [(_plain(dtype.categories[i]), int(counts[i])) for i in order]
+        categories = dtype.categories[present]
+        if dtype.ordered:
+            stats['min'], stats['max'] = _plain(categories[0]), _plain(categories[-1])
+        else:
+            try:
+                stats['min'], stats['max'] = _plain(categories.min()), _plain(categories.max())
+            except TypeError:
+                pass
+        return stats
+
+    numeric = pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype)
+    if not numeric:
+        text = _text_counts(values)
+        if text is not None:
+            stats.update(text)
+            stats.update({name: known[name] for name in ('min', 'max') if name in known})
+            return stats
+
+    if rows <= EXACT_DISTINCT_ROWS:
+        stats['distinct'] = int(values.nunique())
+    else:
+        hll = HyperLogLog()
+        hll.add_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        stats['distinct'] = min(hll.estimate(), len(values))
+        stats['distinct_exact'] = False
+
+    if 'min' in known and 'max' in known:
+        stats['min'], stats['max'] = known['min'], known['max']
+    elif numeric:
+        stats['min'], stats['max'] = _plain(values.min()), _plain(values.max())
+    if not numeric or stats['distinct'] <= TOP_K_MAX_DISTINCT:
+        stats['top'], stats['distinct'] = _top_values(values)
+        stats['distinct_exact'] = True
+    if numeric and not pd.api.types.is_bool_dtype(dtype):
+        stats['histogram'] = _histogram(values)
+    return stats
+
+
+# Statistiques des colonnes d'un dataset, calculées à la demande puis gardées
+class DatasetStats:
+    def __init__(self, df, known=None):
+        self.df = df
+        self.known = known or {}
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def column(self, column_name):
+        with self._lock:
+            stats = self._columns.get(column_name)
+        if stats is None:
+            with stage('column_stats', column=column_name, rows=len(self.df)):
+                stats = column_stats(self.df[column_name], self.known.get(column_name))
+            with self._lock:
+                self._columns[column_name] = stats
+        return stats
+
+    # Tableau résumé de toutes les colonnes
+    def summary(self):
+        rows = []
+        for column_name in self.df.columns:
+            stats = self.column(column_name)
+            distinct = stats['distinct'] if stats['distinct_exact'] else f"~{stats['distinct']}"
+            rows.append({
+                'Colonne': column_name,
+                'Type': stats['dtype'],
+                'Manquantes': stats['nulls'],
+                'Distinctes': str(distinct),
+                'Min': None if stats['min'] is None else str(stats['min']),
+                'Max': None if stats['max'] is None else str(stats['max']),
+                'Plus fréquentes': ', '.join(f'{value} ({count})' for value, count in stats['top'][:3]),
+            })
+        return pd.DataFrame(rows)
+
+
+# Fonction pour obtenir les statistiques d'un dataset chargé, gardées dans le cache
+# d'ingestion (une version du dataset par clé) et partagées par toutes les sessions.
+# known : statistiques déjà connues par colonne (voir engine.parquet.parquet_statistics).
+def stats_for(key, df, known=None):
+    extras = get_cache().extras(key)
+    if extras is None:
+        return DatasetStats(df, known)
+    stats = extras.get('stats')
+    if stats is None or stats.df is not df:
+        stats = extras['stats'] = DatasetStats(df, known)
+    return stats
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Dossier des fichiers Arrow partagés par toutes les sessions du processus
+STORE_DIR = os.environ.get('DATASET_APP_STORE_DIR', os.path.join(tempfile.gettempdir(), 'dataset_app_store'))
+
+# Espace disque maximal occupé par les fichiers du magasin
+STORE_MAX_BYTES = int(os.environ.get('DATASET_APP_STORE_MAX_BYTES', 20 * 1024 ** 3))
+
+# Mettre DATASET_APP_STORE=0 pour garder les datasets uniquement en mémoire
+STORE_ENABLED = os.environ.get('DATASET_APP_STORE', '1') != '0'
+
+
+# Poignée vers un dataset du magasin : c'est tout ce que garde une session.
+# Tant qu'une poignée existe, le fichier ne peut pas être évincé.
+class DatasetHandle:
+    def __init__(self, store, key, frame=None):
+        self.store = store
+        self.key = key
+        # DataFrame gardé en mémoire quand il n'a pas pu être écrit en Arrow
+        self._frame = frame
+        self._finalizer = weakref.finalize(self, store._release, key) if frame is None else None
+
+    @property
+    def frame(self):
+        if self._frame is not None:
+            return self._frame
+        return self.store.read(self.key)
+
+    def release(self):
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+# Magasin de datasets partagé par les sessions : chaque dataset est écrit une seule
+# fois en Arrow IPC (Feather non compressé) puis projeté en mémoire (memory map),
+# sans copie. Le système garde les pages en cache pour toutes les sessions.
+# Les fichiers sans poignée ni DataFrame encore utilisé sont évincés, du moins
+# récemment utilisé au plus récent, quand l'espace disque dépasse max_bytes.
+# Les fichiers laissés par les exécutions précédentes comptent dans cet espace.
+class DatasetStore:
+    def __init__(self, directory=STORE_DIR, max_bytes=STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._refcounts = {}
+        # Chemin du fichier -> clé, dernière utilisation, taille
+        self._keys = {}
+        self._last_used = {}
+        self._sizes = {}
+        self._frames = weakref.WeakValueDictionary()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    # Recenser les fichiers déjà présents, datés par leur dernière modification
+    def _scan(self):
+        now, wall = time.monotonic(), time.time()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.arrow') and entry.is_file():
+                stat = entry.stat()
+                self._sizes[entry.path] = stat.st_size
+                self._last_used[entry.path] = now - (wall - stat.st_mtime)
+
+    def path(self, key):
+        name = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + '.arrow')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def refcount(self, key):
+        with self._lock:
+            return self._refcounts.get(key, 0)
+
+    # Écrire un DataFrame dans le magasin (une seule fois par clé), avec des métadonnées
+    # texte facultatives (voir metadata). Renvoie False si ses colonnes ne peuvent pas
+    # être converties en Arrow.
+    def write(self, key, df, metadata=None):
+        path = self.path(key)
+        with self._lock:
+            if os.path.exists(path):
+                self._touch(key, path)
+                return True
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError):
+            return False
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        # Écriture dans un fichier temporaire puis renommage : une session ne lit
+        # jamais un fichier incomplet
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        with self._lock:
+            self._touch(key, path)
+            self.evict(keep=key)
+        return True
+
+    def _touch(self, key, path):
+        self._keys[path] = key
+        self._last_used[path] = time.monotonic()
+        if path not in self._sizes:
+            self._sizes[path] = os.path.getsize(path)
+
+    # Lire un dataset du magasin : toutes les sessions reçoivent le même DataFrame,
+    # dont les colonnes pointent directement dans le fichier projeté en mémoire
+    def read(self, key):
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._last_used[self.path(key)] = time.monotonic()
+                return df
+            path = self.path(key)
+            if not os.path.exists(path):
+                return None
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas(split_blocks=True)
+            self._frames[key] = df
+            self._touch(key, path)
+            return df
+
+    # Métadonnées écrites avec un dataset (seul le schéma du fichier est lu), ou None
+    def metadata(self, key, name):
+        try:
+            with pa.memory_map(self.path(key)) as source:
+                schema = pa.ipc.open_file(source).schema
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        value = (schema.metadata or {}).get(name.encode('utf-8'))
+        return value.decode('utf-8') if value is not None else None
+
+    # Ouvrir une poignée (le fichier est protégé de l'éviction tant qu'elle existe)
+    def open(self, key):
+        with self._lock:
+            if key not in self:
+                return None
+            self._refcounts[key] = self._refcounts.get(key, 0) + 1
+            self._touch(key, self.path(key))
+            return DatasetHandle(self, key)
+
+    # Partager un DataFrame : écrit s'il ne l'est pas déjà, puis renvoie une poignée.
+    # Un DataFrame non convertible en Arrow reste en mémoire dans la poignée.
+    def share(self, key, df):
+        if not self.write(key, df):
+            return DatasetHandle(self, key, frame=df)
+        return self.open(key)
+
+    def _release(self, key):
+        with self._lock:
+            count = self._refcounts.get(key, 0) - 1
+            if count > 0:
+                self._refcounts[key] = count
+            else:
+                self._refcounts.pop(key, None)
+            self.evict()
+
+    # Un fichier peut être évincé s'il n'a pas de poignée et si aucun DataFrame projeté
+    # sur lui n'est encore utilisé (cache d'ingestion, résultat gardé par une page...)
+    def _evictable(self, path, keep):
+        key = self._keys.get(path)
+        if key is None:
+            return True
+        return key != keep and not self._refcounts.get(key) and self._frames.get(key) is None
+
+    # Supprimer les fichiers évinçables tant que l'espace disque dépasse la limite
+    # (sauf keep, le fichier qui vient d'être écrit)
+    def evict(self, keep=None):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            candidates = sorted((path for path in self._sizes if self._evictable(path, keep)), key=self._last_used.get)
+            for path in candidates:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                total -= self._sizes.pop(path)
+                self._last_used.pop(path, None)
+                self._keys.pop(path, None)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Magasin partagé par toutes les sessions du processus (créé à la première utilisation)
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DatasetStore()
+        return _store
+
+
+# Fonction pour partager un résultat calculé par build() sous une clé : s'il est déjà
+# dans le magasin (calculé par une autre session), il n'est pas recalculé.
+# Renvoie une poignée ; sans magasin, la poignée garde simplement le DataFrame.
+def share_frame(key, build):
+    if not STORE_ENABLED:
+        return DatasetHandle(None, key, frame=build())
+    store = get_store()
+    handle = store.open(key)
+    if handle is None:
+        handle = store.share(key, build())
+    return handle
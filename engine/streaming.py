@@ -0,0 +1,240 @@
+import io
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from engine.ingestion import file_bytes, file_format
+
+# Nombre de lignes lues à la fois
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Nombre de lignes utilisées pour déduire les types des colonnes
+SAMPLE_ROWS = 10_000
+
+# Taille des blocs de texte lus pour le JSON
+JSON_READ_SIZE = 1 << 20
+
+
+# Fonction pour ouvrir une source (chemin, upload Streamlit ou fichier binaire) en lecture
+def open_source(source):
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    if hasattr(source, 'getvalue'):
+        return io.BytesIO(source.getvalue())
+    return io.BytesIO(file_bytes(source))
+
+
+# Fonction pour parcourir un tableau JSON élément par élément, sans tout charger
+def iter_json_array(stream, read_size=JSON_READ_SIZE):
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    def refill():
+        nonlocal buffer, pos, eof
+        chunk = text.read(read_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        separators = ' \t\r\n,' if started else ' \t\r\n'
+        while True:
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            refill()
+        if pos >= len(buffer):
+            if started:
+                raise ValueError("Tableau JSON incomplet")
+            return
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError("Le fichier JSON doit contenir un tableau d'objets")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            refill()
+            continue
+        # Un nombre coupé en fin de bloc peut être décodé à tort : on relit la suite
+        if end == len(buffer) and not eof:
+            refill()
+            continue
+        yield obj
+        pos = end
+
+
+# Fonction pour regrouper des enregistrements JSON en DataFrames
+def _records_to_frames(records, chunk_rows):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+# Fonction pour détecter si un JSON est un tableau ou des lignes JSON (NDJSON)
+def _json_layout(stream):
+    head = stream.read(4096)
+    stream.seek(0)
+    stripped = head.lstrip()
+    if stripped.startswith(b'\xef\xbb\xbf'):
+        stripped = stripped[3:].lstrip()
+    if stripped.startswith(b'['):
+        return 'array'
+    first_line = stripped.split(b'\n', 1)[0]
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        return None
+    # Un objet de colonnes sur une seule ligne n'est pas du NDJSON
+    if not isinstance(record, dict) or all(isinstance(v, (list, dict)) for v in record.values()):
+        return None
+    return 'lines'
+
+
+# Fonction pour lire une source CSV ou JSON par morceaux de DataFrames
+def iter_frames(source, fmt=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    fmt = fmt or file_format(source)
+    stream = open_source(source)
+    try:
+        if fmt == 'csv':
+            with pd.read_csv(stream, chunksize=chunk_rows) as reader:
+                yield from reader
+        elif fmt == 'json':
+            layout = _json_layout(stream)
+            if layout == 'array':
+                yield from _records_to_frames(iter_json_array(stream), chunk_rows)
+            elif layout == 'lines':
+                with pd.read_json(stream, lines=True, chunksize=chunk_rows) as reader:
+                    yield from reader
+            else:
+                # Objet JSON de colonnes : pas de lecture incrémentale possible
+                yield pd.DataFrame(json.load(stream))
+        elif fmt == 'parquet':
+            parquet_file = pq.ParquetFile(stream)
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            raise ValueError("Format de fichier non pris en charge!")
+    finally:
+        stream.close()
+
+
+# Fonction pour convertir un DataFrame en table Arrow, en passant en texte
+# les colonnes de types mélangés
+def _frame_to_table(frame):
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        frame = frame.copy()
+        for col in frame.columns:
+            if frame[col].dtype == 'object':
+                frame[col] = frame[col].where(frame[col].isna(), frame[col].astype(str))
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    return table.replace_schema_metadata(None)
+
+
+# Fonction pour choisir un type assez large pour deux types Arrow
+def _wider_type(current, other):
+    if pa.types.is_null(current):
+        return other
+    if pa.types.is_null(other):
+        return current
+    numeric = (pa.types.is_integer, pa.types.is_floating, pa.types.is_boolean)
+    if any(check(current) for check in numeric) and any(check(other) for check in numeric):
+        return pa.float64()
+    return pa.large_string()
+
+
+# Fonction pour convertir un morceau au schéma fixé, en élargissant les types si nécessaire
+def conform_table(table, schema):
+    for field in table.schema:
+        if schema.get_field_index(field.name) == -1:
+            schema = schema.append(pa.field(field.name, field.type))
+    columns = []
+    for field in schema:
+        if table.schema.get_field_index(field.name) == -1:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        if column.type != field.type:
+            try:
+                column = pc.cast(column, field.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                wider = _wider_type(field.type, column.type)
+                schema = schema.set(schema.get_field_index(field.name), pa.field(field.name, wider))
+                column = pc.cast(column, wider) if column.type != wider else column
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema), schema
+
+
+# Fonction pour lire une source par lots Arrow de schéma fixe.
+# Les types sont déduits des premières lignes puis conservés pour tous les lots.
+def iter_batches(source, fmt=None, chunk_rows=DEFAULT_CHUNK_ROWS, sample_rows=SAMPLE_ROWS):
+    fmt = fmt or file_format(source)
+    if fmt == 'parquet':
+        stream = open_source(source)
+        try:
+            parquet_file = pq.ParquetFile(stream)
+            for i in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(i)
+                yield from table.to_batches(max_chunksize=chunk_rows)
+        finally:
+            stream.close()
+        return
+
+    schema = None
+    for frame in iter_frames(source, fmt, chunk_rows):
+        if schema is None:
+            schema = _frame_to_table(frame.head(sample_rows)).schema
+        table = _frame_to_table(frame)
+        table, schema = conform_table(table, schema)
+        yield from table.to_batches()
+
+
+# Fonction pour convertir une table Arrow en DataFrame compact (chaînes Arrow)
+def table_to_frame(table):
+    string_dtype = pd.StringDtype('pyarrow')
+    mapping = {pa.string(): string_dtype, pa.large_string(): string_dtype}
+    return table.to_pandas(types_mapper=mapping.get, split_blocks=True, self_destruct=True)
+
+
+# Fonction pour charger une source en entier, par morceaux, dans un stockage en colonnes.
+# progress(lignes lues, None) est appelé après chaque morceau.
+def load_streaming(source, fmt=None, chunk_rows=DEFAULT_CHUNK_ROWS, sample_rows=SAMPLE_ROWS, progress=None):
+    batches = []
+    schema = None
+    rows = 0
+    for batch in iter_batches(source, fmt, chunk_rows, sample_rows):
+        batches.append(batch)
+        schema = batch.schema
+        rows += batch.num_rows
+        if progress is not None:
+            progress(rows, None)
+    if schema is None:
+        return pd.DataFrame()
+    # Les premiers lots ont pu être lus avec un schéma moins large
+    batches = [conform_table(pa.Table.from_batches([b]), schema)[0] for b in batches]
+    table = pa.concat_tables(batches)
+    del batches
+    return table_to_frame(table)
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import ExitStack
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from engine.export import parquet_compatible
+from engine.ingestion import get_cache
+from engine.perf import stage
+
+# Dossier des versions enregistrées (un sous-dossier par dataset)
+VERSIONS_DIR = os.environ.get('DATASET_APP_VERSIONS_DIR', 'versions')
+
+# Nombre de lignes d'un groupe : unité des écritures incrémentales
+VERSION_ROW_GROUP_ROWS = int(os.environ.get('DATASET_APP_VERSION_ROW_GROUP_ROWS', 100_000))
+
+# Compression des fichiers Parquet des versions
+VERSION_COMPRESSION = 'zstd'
+
+MANIFEST_NAME = 'manifest.json'
+
+
+# Fonction pour obtenir un nom de dataset utilisable comme nom de dossier
+def dataset_name(name):
+    name = re.sub(r'[^\w.-]+', '_', str(name).strip()).strip('._')
+    if not name:
+        raise ValueError("Nom de dataset invalide.")
+    return name
+
+
+# Fonction pour calculer l'empreinte du contenu d'un morceau de colonne
+def _chunk_hash(chunk):
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+
+# Fonction pour découper les lignes en groupes selon leur identifiant stable (voir
+# engine.editlog) : le groupe g contient les lignes d'identifiant compris entre
+# g * group_rows et (g + 1) * group_rows. Supprimer une ligne ne change que son groupe,
+# et les lignes ajoutées (identifiants plus grands) ne touchent que les derniers.
+# Sans identifiants, ce sont les positions des lignes. Renvoie les bornes (début, fin).
+def _row_groups(n_rows, row_ids, group_rows):
+    if row_ids is None:
+        row_ids = np.arange(n_rows)
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) != n_rows:
+        raise ValueError("Il faut un identifiant par ligne.")
+    if len(row_ids) > 1 and np.any(np.diff(row_ids) <= 0):
+        raise ValueError("Les identifiants de lignes doivent être croissants.")
+    last = int(row_ids[-1]) if len(row_ids) else 0
+    limits = np.searchsorted(row_ids, np.arange(0, last // group_rows + 2) * group_rows)
+    return list(zip(limits[:-1].tolist(), limits[1:].tolist()))
+
+
+# Versions enregistrées sur disque, en Parquet. Chaque colonne est découpée en groupes
+# de lignes (selon l'identifiant stable des lignes, voir _row_groups) ; le manifeste
+# d'une version donne, pour chaque groupe de chaque colonne, le fichier et le groupe
+# de lignes où il est stocké et l'empreinte de son contenu.
+# Une nouvelle version n'écrit que les groupes dont l'empreinte a changé (un fichier
+# par colonne modifiée) et reprend les autres de la version précédente : l'espace
+# occupé croît avec le volume des modifications, pas avec le nombre de versions.
+class VersionStore:
+    def __init__(self, directory=VERSIONS_DIR, row_group_rows=VERSION_ROW_GROUP_ROWS):
+        self.directory = directory
+        self.row_group_rows = row_group_rows
+        self._lock = threading.Lock()
+
+    def _dataset_dir(self, name):
+        return os.path.join(self.directory, dataset_name(name))
+
+    def datasets(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, name, MANIFEST_NAME)))
+
+    def _read_manifest(self, name):
+        path = os.path.join(self._dataset_dir(name), MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {'name': dataset_name(name), 'versions': []}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    # Écriture dans un fichier temporaire puis renommage : le manifeste n'est jamais lu incomplet
+    def _write_manifest(self, name, manifest):
+        directory = self._dataset_dir(name)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+    # Liste des versions d'un dataset (métadonnées du manifeste, sans les morceaux)
+    def versions(self, name):
+        return [{k: v for k, v in entry.items() if k != 'columns'} for entry in self._read_manifest(name)['versions']]
+
+    # Historique lisible des versions d'un dataset
+    def history(self, name):
+        rows = [{
+            'Version': entry['version'],
+            'Date': entry['timestamp'],
+            'Auteur': entry['author'],
+            'Message': entry['message'],
+            'Lignes': entry['rows'],
+            'Colonnes': entry['column_count'],
+            'Groupes écrits': f"{entry['chunks_written']}/{entry['chunks_total']}",
+            'Écrit (Mo)': round(entry['bytes_written'] / 1024 ** 2, 2),
+        } for entry in self._read_manifest(name)['versions']]
+        return pd.DataFrame(rows)
+
+    # Enregistrer un DataFrame comme nouvelle version d'un dataset. row_ids donne
+    # l'identifiant stable de chaque ligne (croissant, voir EditLog.row_ids).
+    # progress(fait, total) suit l'avancement en colonnes.
+    def save(self, name, df, author, message='', progress=None, row_ids=None):
+        if not author:
+            raise ValueError("Veuillez indiquer l'auteur de la version.")
+        df = parquet_compatible(df.reset_index(drop=True))
+        groups = _row_groups(len(df), row_ids, self.row_group_rows)
+        directory = self._dataset_dir(name)
+        with self._lock, stage('version_save', rows=len(df), columns=len(df.columns)) as details:
+            os.makedirs(directory, exist_ok=True)
+            manifest = self._read_manifest(name)
+            previous = manifest['versions'][-1] if manifest['versions'] else None
+            # Les groupes d'une version découpée autrement ne se correspondent pas
+            if previous is not None and previous.get('chunk_rows', self.row_group_rows) != self.row_group_rows:
+                previous = None
+            previous_columns = {col['name']: col for col in previous['columns']} if previous else {}
+            number = manifest['versions'][-1]['version'] + 1 if manifest['versions'] else 1
+
+            columns, written, total, bytes_written = [], 0, 0, 0
+            for i, col in enumerate(df.columns):
+                series = df[col]
+                dtype = str(series.dtype)
+                schema = pa.Schema.from_pandas(series.iloc[:0].to_frame(str(col)), preserve_index=False)
+                # Les groupes sont comparés par type Arrow stocké : une colonne d'entiers passée
+                # en Int64 par un ajout de ligne (voir engine.editlog) garde ses anciens groupes
+                arrow_type = str(schema.types[0])
+                before = previous_columns.get(str(col))
+                if before is not None and (before['arrow_type'] != arrow_type if 'arrow_type' in before
+                                           else before['dtype'] != dtype):
+                    before = None
+                chunks, new_chunks = [], []
+                for g, (start, stop) in enumerate(groups):
+                    chunk = series.iloc[start:stop]
+                    digest = _chunk_hash(chunk)
+                    if before is not None and g < len(before['chunks']) and before['chunks'][g]['hash'] == digest:
+                        chunks.append(before['chunks'][g])
+                    elif not len(chunk):
+                        # Groupe vide (toutes ses lignes supprimées) : rien à écrire
+                        chunks.append({'file': None, 'row_group': None, 'hash': digest})
+                    else:
+                        chunks.append(None)
+                        new_chunks.append((g, chunk, digest))
+                if new_chunks:
+                    # Un fichier par colonne modifiée, un groupe de lignes par morceau réécrit
+                    file_name = f'v{number:05d}_c{i:05d}.parquet'
+                    path = os.path.join(directory, file_name)
+                    with pq.ParquetWriter(path, schema, compression=VERSION_COMPRESSION) as writer:
+                        for row_group, (g, chunk, digest) in enumerate(new_chunks):
+                            table = pa.Table.from_pandas(chunk.to_frame(str(col)), schema=schema, preserve_index=False)
+                            writer.write_table(table, row_group_size=max(len(table), 1))
+                            chunks[g] = {'file': file_name, 'row_group': row_group, 'hash': digest}
+                    bytes_written += os.path.getsize(path)
+                written += len(new_chunks)
+                total += len(chunks)
+                columns.append({'name': str(col), 'dtype': dtype, 'arrow_type': arrow_type, 'chunks': chunks})
+                if progress is not None:
+                    progress(i + 1, len(df.columns))
+
+            entry = {
+                'version': number,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'author': author,
+                'message': message,
+                'rows': len(df),
+                'column_count': len(columns),
+                'chunk_rows': self.row_group_rows,
+                'chunks_written': written,
+                'chunks_total': total,
+                'bytes_written': bytes_written,
+                'columns': columns,
+            }
+            manifest['versions'].append(entry)
+            self._write_manifest(name, manifest)
+            details['chunks_written'] = written
+            details['bytes'] = bytes_written
+        return {k: v for k, v in entry.items() if k != 'columns'}
+
+    # Relire une version (la dernière par défaut). Les groupes consécutifs stockés dans
+    # le même fichier sont lus en une fois ; la version relue est gardée dans le cache
+    # d'ingestion, une version n'étant jamais modifiée.
+    def open(self, name, version=None):
+        manifest = self._read_manifest(name)
+        if not manifest['versions']:
+            raise ValueError(f"Aucune version enregistrée pour « {name} ».")
+        if version is None:
+            entry = manifest['versions'][-1]
+        else:
+            entry = next((v for v in manifest['versions'] if v['version'] == version), None)
+            if entry is None:
+                raise ValueError(f"Version {version} introuvable pour « {name} ».")
+        cache_key = f"version:{manifest['name']}:{entry['version']}"
+        df = get_cache().get(cache_key)
+        if df is not None:
+            return df
+
+        directory = self._dataset_dir(name)
+        with stage('version_open', version=entry['version'], rows=entry['rows']), ExitStack() as opened:
+            # Fichiers ouverts une fois pour toute la lecture, fermés à la fin
+            files = {}
+            data = {}
+            for column in entry['columns']:
+                tables, run = [], []
+                for chunk in [c for c in column['chunks'] if c['file'] is not None] + [None]:
+                    if run and (chunk is None or chunk['file'] != run[0]['file']
+                                or chunk['row_group'] != run[-1]['row_group'] + 1):
+                        parquet_file = files.get(run[0]['file'])
+                        if parquet_file is None:
+                            parquet_file = opened.enter_context(pq.ParquetFile(os.path.join(directory, run[0]['file'])))
+                            files[run[0]['file']] = parquet_file
+                        tables.append(parquet_file.read_row_groups([c['row_group'] for c in run]))
+                        run = []
+                    if chunk is not None:
+                        run.append(chunk)
+                if tables:
+                    series = pa.concat_tables(tables).to_pandas()[column['name']]
+                    # Groupes repris d'une version où la colonne avait un autre type pandas
+                    if str(series.dtype) != column['dtype']:
+                        series = series.astype(column['dtype'])
+                    data[column['name']] = series
+                else:
+                    data[column['name']] = pd.Series(dtype=column['dtype'])
+            df = pd.DataFrame(data)
+        get_cache().put(cache_key, df)
+        return df
+
+
+_version_store = None
+_version_store_lock = threading.Lock()
+
+
+# Magasin de versions partagé par toutes les sessions du processus
+def get_version_store():
+    global _version_store
+    with _version_store_lock:
+        if _version_store is None:
+            _version_store = VersionStore()
+        return _version_store
@@ -1,13 +1,24 @@
 ﻿from inspect import signature
 import streamlit as st
 import pandas as pd
-import pyarrow.parquet as pq
-import pyarrow as pa
 import datetime
+import io
+
+from components.downloads import download_button
+from components.jobs import poll_jobs
+from components.perf import perf_panel
+from components.viewer import show_dataframe
+from engine.export import CHUNK_ROWS, PARQUET_COMPRESSIONS
+from engine.ingestion import parse_file
+from engine.perf import start_run
+from engine.rowbuffer import RowBuffer
+
+# Mesures de durée et de mémoire de ce rerun (voir engine.perf)
+recorder = start_run('create')
 
 # Initialiser session_state si nécessaire
-if "df" not in st.session_state:
-    st.session_state.df = pd.DataFrame()
+if "rows" not in st.session_state:
+    st.session_state.rows = RowBuffer()
 if "new_row" not in st.session_state:
     st.session_state.new_row = {}
 if "col_names" not in st.session_state:
@@ -22,24 +33,44 @@ new_col_name = st.text_input("Entrez le nom de la nouvelle colonne")
 if new_col_name:  # Vérifier si le nom de la colonne n'est pas vide
     if st.button("Ajouter la colonne"):
         st.session_state.col_names.append(new_col_name)
-        # Ajouter la nouvelle colonne au DataFrame existant
-        if new_col_name not in st.session_state.df.columns:
-            st.session_state.df[new_col_name] = pd.Series()
+        # Ajouter la nouvelle colonne au tampon de lignes existant
+        st.session_state.rows.add_column(new_col_name)
+
+# Import en masse : des milliers de lignes ajoutées en une seule opération
+with st.expander("Import en masse", expanded=False):
+    pasted_rows = st.text_area("Collez des lignes CSV (la première ligne contient les noms des colonnes)", key='bulk_paste')
+    imported_file = st.file_uploader("Ou choisissez un fichier JSON, CSV ou Parquet", type=["json", "csv", "parquet"], key='bulk_file')
+    if st.button("Importer les lignes"):
+        try:
+            if imported_file is not None:
+                imported = parse_file(imported_file)
+            elif pasted_rows.strip():
+                imported = pd.read_csv(io.StringIO(pasted_rows), dtype=str, keep_default_na=False)
+            else:
+                imported = None
+        except ValueError as e:
+            st.error(f"Import impossible : {e}")
+            imported = None
+        if imported is not None:
+            for col_name in imported.columns:
+                if col_name not in st.session_state.col_names:
+                    st.session_state.col_names.append(col_name)
+            st.session_state.rows.extend_frame(imported)
+            st.success(f"{len(imported)} lignes importées")
 
 # Si des colonnes ont été ajoutées
-if st.session_state.df.columns.tolist():
+if st.session_state.rows.columns:
     # Demander les valeurs pour chaque colonne
-    for col_name in st.session_state.df.columns:
+    for col_name in st.session_state.rows.columns:
         st.session_state.new_row[col_name] = st.text_input(f"Entrez la valeur pour '{col_name}'")
 
     # Si l'utilisateur clique sur le bouton "Ajouter la ligne"
     if st.button("Ajouter la ligne"):
-        # Ajouter la nouvelle ligne au DataFrame
-        new_data = pd.DataFrame(st.session_state.new_row, index=[0])
-        st.session_state.df = pd.concat([st.session_state.df, new_data], ignore_index=True)
+        # Ajouter la nouvelle ligne au tampon
+        st.session_state.rows.append(st.session_state.new_row)
 
-    # Afficher le DataFrame
-    st.dataframe(st.session_state.df)
+    # Afficher le DataFrame (construit seulement si le tampon a changé)
+    show_dataframe(st.session_state.rows.to_frame(), key='create')
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -57,23 +88,35 @@ if st.session_state.df.columns.tolist():
         user_name = st.text_input("Entrez votre nom")
         if user_name:
             if st.button("Valider"):
-                signature = pd.Series({st.session_state.col_names[0] : user_name, st.session_state.col_names[1] : str(datetime.datetime.now())})
-                st.session_state.df = pd.concat([st.session_state.df, signature.to_frame().T], ignore_index=True)
+                signature = {st.session_state.col_names[0] : user_name, st.session_state.col_names[1] : str(datetime.datetime.now())}
+                st.session_state.rows.append(signature)
     with col3:
         if st.button("Réinitialiser"):
-            st.session_state.df = pd.DataFrame()
+            st.session_state.rows = RowBuffer()
             st.session_state.new_row = {}
             st.session_state.col_names = []
             st.rerun()
 
     # Boutons de téléchargement dans différents formats
     if st.session_state.show_download_buttons:
+        # Options d'écriture Parquet (le fichier est produit en mémoire, à la demande)
+        option1, option2 = st.columns(2)
+        with option1:
+            compression = st.selectbox("Compression Parquet", PARQUET_COMPRESSIONS, key='parquet_compression')
+        with option2:
+            row_group_size = st.number_input("Lignes par groupe Parquet", min_value=1, value=CHUNK_ROWS, step=1000, key='parquet_row_group_size')
+
+        df = st.session_state.rows.to_frame()
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.download_button("Télécharger en CSV", data=st.session_state.df.to_csv(index=False), file_name="data.csv", mime="text/csv")
+            download_button(df, 'csv', "Télécharger en CSV", "data.csv", key='create_csv')
         with col2:
-            st.download_button("Télécharger en JSON", data=st.session_state.df.to_json(orient="records"), file_name="data.json", mime="application/json")
+            download_button(df, 'json', "Télécharger en JSON", "data.json", key='create_json')
         with col3:
-            table = pa.Table.from_pandas(st.session_state.df)
-            pq.write_table(table, 'data.parquet')
-            st.download_button("Télécharger en Parquet", data=open('data.parquet', 'rb').read(), file_name="data.parquet", mime="application/octet-stream")
+            download_button(df, 'parquet', "Télécharger en Parquet", "data.parquet", key='create_parquet',
+                            compression=compression, row_group_size=int(row_group_size))
+
+perf_panel(recorder)
+
+# Suivre les exports préparés en tâche de fond
+poll_jobs()
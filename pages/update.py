@@ -1,103 +1,118 @@
+import os
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import json
-import io
 from datetime import datetime
 
-# Fonction pour lire les fichiers
-def load_file(file):
-    if file.name.endswith('.json'):
-        data = json.load(file)
-        return pd.DataFrame(data)
-    elif file.name.endswith('.csv'):
-        return pd.read_csv(file)
-    elif file.name.endswith('.parquet'):
-        return pd.read_parquet(file)
-    else:
-        st.error("Format de fichier non pris en charge!")
-        return None
-
-# Fonction pour ajouter une nouvelle colonne
-def add_column(df, col_name, col_type):
-    if col_type == 'string':
-        df[col_name] = ""
-    elif col_type == 'int':
-        df[col_name] = 0
-    elif col_type == 'float':
-        df[col_name] = 0.0
-    return df
-
-# Fonction pour s'assurer que la signature est à la fin du DataFrame
-def ensure_signature_at_end(df):
-    if 'Signature' in df.columns:
-        columns = [col for col in df.columns if col != 'Signature'] + ['Signature']
-        df = df[columns]
-    return df
+from components.downloads import download_buttons
+from components.jobs import job_result, load_dataset, poll_jobs, start_job
+from components.memory import show_memory_report
+from components.perf import perf_panel
+from components.viewer import show_dataframe
+from engine.backends import BACKEND_LABELS, available_backends, backend_for
+from engine.diff import diff_frames
+from engine.editlog import EditLog
+from engine.export import frame_version
+from engine.filters import FilterChainCache, result_key
+from engine.ingestion import dataset_handle, dataset_key, dataset_source, file_fingerprint
+from engine.jobs import BACKGROUND_MIN_ROWS
+from engine.patches import read_patch_file
+from engine.perf import start_run
+from engine.store import share_frame
+from engine.versions import get_version_store
+
+# Mesures de durée et de mémoire de ce rerun (voir engine.perf)
+recorder = start_run('update')
 
 # Téléchargement du fichier
 uploaded_file = st.file_uploader("Choisissez un fichier JSON, CSV ou Parquet", type=["json", "csv", "parquet"])
+streaming = st.checkbox("Lecture par morceaux (fichiers volumineux)", key='streaming_load')
+compact = st.checkbox("Optimiser la mémoire (types compacts)", key='compact_load')
 
 if uploaded_file is not None:
-    df = load_file(uploaded_file)
+    # Un fichier volumineux est chargé en tâche de fond (voir components.jobs)
+    key = dataset_key(uploaded_file, streaming, compact)
+    try:
+        df = load_dataset(uploaded_file, key, 'update_load', streaming=streaming, compact=compact)
+    except ValueError as e:
+        st.error(str(e))
+        df = None
     if df is not None:
         st.write('### DataFrame original :')
-        st.dataframe(df)
+        show_dataframe(df, key='update_original')
+        show_memory_report(key)
 
         # Initialisation de la liste des modifications et des filtres
         if 'modifications' not in st.session_state:
             st.session_state.modifications = []
         if 'filters' not in st.session_state:
             st.session_state.filters = []
-
-        # Charger le DataFrame modifié stocké dans session_state s'il existe
-        if 'modified_df' in st.session_state:
-            df = st.session_state.modified_df
+        if 'update_filter_cache' not in st.session_state:
+            st.session_state.update_filter_cache = FilterChainCache()
+
+        # Journal des modifications : le DataFrame chargé n'est jamais copié,
+        # les modifications sont enregistrées et la vue modifiée construite à la demande
+        # Poignée vers le dataset du magasin partagé (voir engine.store) : il n'est pas copié dans la session
+        if getattr(st.session_state.get('update_dataset'), 'key', None) != key:
+            st.session_state.update_dataset = dataset_handle(key)
+        # Le journal suit le fichier source : changer les options de lecture (par morceaux,
+        # types compacts) recharge les mêmes lignes et garde les modifications
+        source = file_fingerprint(uploaded_file)
+        if 'edit_log' not in st.session_state or st.session_state.edit_log.key != source:
+            st.session_state.edit_log = EditLog(df, source)
+        log = st.session_state.edit_log
+        log.rebind(df)
+        df = log.view()
 
         # Sections dépliantes pour ajouter et supprimer des lignes et des colonnes
         st.write('### Ajouter ou supprimer des lignes et des colonnes :')
 
         with st.expander("Ajouter une ligne", expanded=False):
             if st.button('Ajouter une ligne'):
-                new_row_data = {col: None for col in df.columns if col != 'Signature'}
-                new_row = pd.DataFrame([new_row_data])
-                df = pd.concat([df, new_row], ignore_index=True)
-                df = ensure_signature_at_end(df)
-                st.session_state.modified_df = df.copy()
-                st.experimental_rerun()
+                log.add_row()
+                st.rerun()
 
         with st.expander("Ajouter une colonne", expanded=False):
             new_col_name = st.text_input('Nom de la nouvelle colonne', key='new_col')
             col_type = st.selectbox('Type de la nouvelle colonne', ['string', 'int', 'float'], key='new_col_type')
             if st.button("Ajouter une colonne") and new_col_name:
-                df = add_column(df, new_col_name, col_type)
-                df = ensure_signature_at_end(df)
-                st.session_state.modified_df = df.copy()
-                st.experimental_rerun()
+                log.add_column(new_col_name, col_type)
+                st.rerun()
 
         with st.expander("Supprimer une ligne", expanded=False):
-            row_to_delete = st.number_input('Index de la ligne à supprimer', min_value=0, max_value=len(df)-1, step=1, key='row_to_delete')
+            row_to_delete = st.number_input('Index de la ligne à supprimer', min_value=0, max_value=max(len(df)-1, 0), step=1, key='row_to_delete')
             if st.button("Supprimer une ligne"):
-                df = df.drop(index=row_to_delete).reset_index(drop=True)
-                df = ensure_signature_at_end(df)
-                st.session_state.modified_df = df.copy()
-                st.experimental_rerun()
+                log.delete_row(row_to_delete)
+                st.rerun()
 
         with st.expander("Supprimer une colonne", expanded=False):
             col_to_delete = st.selectbox('Colonne à supprimer', [col for col in df.columns if col != 'Signature'], key='col_to_delete')
             if st.button("Supprimer une colonne"):
-                df = df.drop(columns=[col_to_delete])
-                df = ensure_signature_at_end(df)
-                st.session_state.modified_df = df.copy()
-                st.experimental_rerun()
+                log.delete_column(col_to_delete)
+                st.rerun()
+
+        # Annuler ou rétablir la dernière opération du journal
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            if st.button("Annuler", disabled=not log.can_undo()):
+                log.undo()
+                st.rerun()
+        with col2:
+            if st.button("Rétablir", disabled=not log.can_redo()):
+                log.redo()
+                st.rerun()
+        with col3:
+            st.caption(f"{len(log)} opération(s) dans le journal")
 
         # Afficher le DataFrame après modifications
         st.write('### DataFrame après modifications :')
-        st.dataframe(df)
+        show_dataframe(df, key='update_modified')
 
         # Saisie de la modification
         st.write('### Modifications des valeurs:')
         with st.form(key='modification_form'):
-            row_index = st.number_input('Entrez l\'index de la ligne à modifier', min_value=0, max_value=len(df)-1, step=1)
+            row_index = st.number_input('Entrez l\'index de la ligne à modifier', min_value=0, max_value=max(len(df)-1, 0), step=1)
             column_name = st.selectbox('Choisissez le nom de la colonne à modifier', df.columns)
             new_value = st.text_input('Entrez la nouvelle valeur')
             add_modification = st.form_submit_button('Ajouter la modification')
@@ -116,22 +131,36 @@ if uploaded_file is not None:
             with col2:
                 if st.button('Supprimer', key=f'delete_{i}'):
                     st.session_state.modifications.pop(i)
-                    st.experimental_rerun()
+                    st.rerun()
+
+        # Appliquer en une fois un fichier de modifications (colonnes ligne, colonne, valeur)
+        with st.expander("Importer un fichier de modifications", expanded=False):
+            patch_file = st.file_uploader("Fichier CSV ou JSON avec les colonnes ligne, colonne et valeur", type=["csv", "json"], key='patch_file')
+            if patch_file is not None and st.button("Appliquer le fichier de modifications"):
+                try:
+                    cells = read_patch_file(patch_file)
+                    unknown = sorted({name for _, name, _ in cells} - set(df.columns))
+                    if unknown:
+                        raise ValueError(f"Colonnes inconnues dans le fichier de modifications : {', '.join(unknown)}")
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    valid = [cell for cell in cells if cell[0] < len(df)]
+                    log.set_cells(valid)
+                    st.success(f"{len(valid)} modification(s) appliquée(s), {len(cells) - len(valid)} ignorée(s) (ligne hors du DataFrame)")
+                    df = log.view()
+                    show_dataframe(df, key='update_patched')
 
         # Appliquer les modifications et la signature
         col1, col2, col3 = st.columns([1, 1, 1])
 
         with col1:
             if st.button('Appliquer toutes les modifications'):
-                for mod in st.session_state.modifications:
-                    row_index, column_name, new_value = mod
-                    if row_index < len(df):  # Appliquer la modification seulement si l'index est valide
-                        df.loc[row_index, column_name] = new_value
+                # Appliquer les modifications seulement si l'index est valide
+                log.set_cells([mod for mod in st.session_state.modifications if mod[0] < len(df)])
+                df = log.view()
                 st.write('### DataFrame modifié :')
-                st.dataframe(df)
-
-                # Sauvegarder le DataFrame modifié sans signature
-                st.session_state.modified_df = df.copy()
+                show_dataframe(df, key='update_applied')
 
                 # Réinitialiser la liste des modifications
                 st.session_state.modifications = []
@@ -140,21 +169,18 @@ if uploaded_file is not None:
             if st.button("Réinitialiser les modifications"):
                 if 'modifications' in st.session_state:
                     st.session_state.modifications = []
-                st.experimental_rerun()
+                st.rerun()
 
         with col3:
             with st.expander("Ajouter une signature", expanded=False):
                 user_name = st.text_input("Votre nom")
                 if st.button("Ajouter Signature"):
                     if user_name:
-                        if 'modified_df' in st.session_state:
-                            df_with_signature = st.session_state.modified_df.copy()
+                        if len(log):
                             signature = f"Modifié par {user_name} le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                            df_with_signature.at[0, 'Signature'] = signature
-                            df_with_signature = ensure_signature_at_end(df_with_signature)
+                            log.set_cells([(0, 'Signature', signature)])
                             st.write('### DataFrame avec signature :')
-                            st.dataframe(df_with_signature)
-                            st.session_state.modified_df = df_with_signature
+                            show_dataframe(log.view(), key='update_signed')
                         else:
                             st.error("Veuillez appliquer les modifications avant d'ajouter une signature.")
                     else:
@@ -176,55 +202,73 @@ if uploaded_file is not None:
             )
             st.markdown('<div class="small-button">', unsafe_allow_html=True)
 
-            if 'modified_df' in st.session_state:
-                modified_json = st.session_state.modified_df.to_json(orient='records', indent=2)
-                modified_csv = st.session_state.modified_df.to_csv(index=False).encode('utf-8')
-
-                try:
-                    buffer = io.BytesIO()
-                    # Convertir explicitement les colonnes en types compatibles
-                    for col in st.session_state.modified_df.columns:
-                        if st.session_state.modified_df[col].dtype == 'object':
-                            st.session_state.modified_df[col] = st.session_state.modified_df[col].astype('string')
-
-                    st.session_state.modified_df.to_parquet(buffer, index=False)
-                    modified_parquet = buffer.getvalue()
-
-                    st.download_button(
-                        label="Télécharger en JSON",
-                        data=modified_json,
-                        file_name="modified_data.json",
-                        mime="application/json"
-                    )
-                    st.download_button(
-                        label="Télécharger en CSV",
-                        data=modified_csv,
-                        file_name="modified_data.csv",
-                        mime="text/csv"
-                    )
-                    st.download_button(
-                        label="Télécharger en Parquet",
-                        data=modified_parquet,
-                        file_name="modified_data.parquet",
-                        mime="application/octet-stream"
-                    )
-                except Exception as e:
-                    st.error(f"Erreur lors de la conversion en Parquet: {e}")
+            if len(log):
+                download_buttons(log.view(), 'modified_data', key='download_modified', indent=2)
 
             st.markdown('</div>', unsafe_allow_html=True)
 
-        # Fonction pour appliquer les filtres
-        def apply_filters(df, filters):
-            for column_name, condition, value in filters:
-                if condition == 'equals':
-                    df = df[df[column_name] == value]
-                elif condition == 'contains':
-                    df = df[df[column_name].str.contains(value, na=False)]
-                elif condition == 'greater_than':
-                    df = df[df[column_name] > value]
-                elif condition == 'less_than':
-                    df = df[df[column_name] < value]
-            return df
+        # Versions enregistrées sur disque (voir engine.versions) : un enregistrement n'écrit
+        # que les groupes de lignes modifiés depuis la version précédente
+        st.write('### Versions :')
+        with st.expander("Enregistrer ou rouvrir une version", expanded=False):
+            versions = get_version_store()
+            version_name = st.text_input('Nom du dataset', value=os.path.splitext(uploaded_file.name)[0], key='version_name')
+            version_author = st.text_input('Auteur', key='version_author')
+            version_message = st.text_input('Message', key='version_message')
+            if st.button('Enregistrer une version'):
+                if not version_author:
+                    st.error("Veuillez entrer votre nom pour enregistrer une version.")
+                else:
+                    # Groupes de lignes découpés selon l'identifiant des lignes dans le journal :
+                    # une suppression ou un ajout de ligne ne réécrit que les groupes concernés
+                    current, row_ids = log.view(), log.row_ids()
+                    start_job('update_version_save',
+                              ('version_save', version_name, frame_version(current), version_author, version_message),
+                              lambda progress: versions.save(version_name, current, version_author, version_message,
+                                                             progress, row_ids),
+                              background=len(current) >= BACKGROUND_MIN_ROWS)
+            saved = job_result('update_version_save', 'Enregistrement de la version')
+            if saved is not None:
+                st.success(f"Version {saved['version']} enregistrée : {saved['chunks_written']}/{saved['chunks_total']} "
+                           f"groupes de lignes écrits ({saved['bytes_written'] / 1024 ** 2:.1f} Mo)")
+            try:
+                history = versions.history(version_name)
+            except ValueError as e:
+                st.error(str(e))
+                history = pd.DataFrame()
+            if len(history):
+                st.dataframe(history, hide_index=True)
+                selected = st.selectbox('Version à rouvrir', history['Version'].tolist()[::-1], key='version_selected')
+                if st.button('Rouvrir la version'):
+                    st.session_state.opened_version = (version_name, selected)
+            opened = st.session_state.get('opened_version')
+            if opened is not None:
+                try:
+                    version_df = versions.open(*opened)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.write(f"### Version {opened[1]} de {opened[0]} :")
+                    show_dataframe(version_df, key='update_version')
+                    download_buttons(version_df, f'{opened[0]}_v{opened[1]}', key='download_version', indent=2)
+
+        # Comparer la version modifiée à l'original : les lignes sont associées par leur
+        # identifiant dans le journal, sans dépendre de leur position
+        st.write("### Comparer avec l'original :")
+        if st.button("Comparer avec l'original", disabled=not len(log)):
+            base, keys = log.base, (np.arange(len(log.base)), log.row_ids())
+            start_job('update_diff', ('diff', key, frame_version(df)),
+                      lambda progress: diff_frames(base, df, keys=keys),
+                      background=len(df) >= BACKGROUND_MIN_ROWS)
+        diff = job_result('update_diff', 'Comparaison en cours')
+        if diff is not None:
+            st.session_state.update_diff = diff
+        if st.session_state.get('update_diff') is not None:
+            diff = st.session_state.update_diff
+            st.write(f"Original → version modifiée : {diff.summary()}")
+            if len(diff.changes):
+                show_dataframe(diff.changes, key='update_diff')
+                download_buttons(diff.changes, 'diff_modifications', key='download_diff', label_suffix=' (différences)', indent=2)
 
         # Gestion des filtres
         st.write('### Filtrer les données :')
@@ -236,7 +280,7 @@ if uploaded_file is not None:
 
         if add_filter:
             st.session_state.filters.append((column_name, condition, value))
-            st.experimental_rerun()
+            st.rerun()
 
         # Afficher les filtres en attente
         st.write('### Filtres en attente :')
@@ -248,51 +292,44 @@ if uploaded_file is not None:
             with col2:
                 if st.button('Supprimer', key=f'delete_filter_{i}'):
                     st.session_state.filters.pop(i)
-                    st.experimental_rerun()
-
-        # Appliquer les filtres et afficher le DataFrame filtré
+                    st.rerun()
+
+        # Moteur de requête : tant qu'aucune modification n'est enregistrée, les filtres
+        # peuvent être évalués directement sur le fichier du magasin
+        source, source_format = dataset_source(key) if not len(log) else (None, None)
+        backend_name = st.selectbox('Moteur de requête', available_backends(source_format),
+                                    format_func=BACKEND_LABELS.get, key='update_query_backend')
+        backend = backend_for(backend_name, df, source, source_format, cache=st.session_state.update_filter_cache)
+
+        # Appliquer les filtres et afficher le DataFrame filtré. Un grand DataFrame est
+        # filtré en tâche de fond. Le résultat est partagé dans le magasin sous une clé
+        # liée à cette version de la vue modifiée (dataset et opérations du journal) :
+        # la session et la tâche n'en gardent qu'une poignée.
         if st.button('Appliquer les filtres'):
-            filtered_df = apply_filters(df, st.session_state.filters)
+            filters = list(st.session_state.filters)
+            view_key = f'{key}|edits:{log.fingerprint()}' if len(log) else key
+            filter_key = result_key(view_key, filters)
+            start_job('update_filter', ('filter', filter_key),
+                      lambda progress: share_frame(filter_key, lambda: backend.query(filters, progress=progress)),
+                      background=len(df) >= BACKGROUND_MIN_ROWS)
+        filtered = job_result('update_filter', 'Filtrage en cours')
+        if filtered is not None:
+            # Sauvegarder la poignée du DataFrame filtré dans session_state
+            st.session_state.filtered_df = filtered
+            st.session_state.update_filtered_df = filtered
+
+        # Le résultat reste affiché pour pouvoir le parcourir page par page
+        if st.session_state.get('update_filtered_df') is not None:
             st.write('### DataFrame après filtrage :')
-            st.dataframe(filtered_df)
-
-            # Sauvegarder le DataFrame filtré dans session_state
-            st.session_state.filtered_df = filtered_df
+            show_dataframe(st.session_state.update_filtered_df.frame, key='update_filtered')
 
         # Options pour télécharger les filtres
         st.write('### Télécharger les filtres appliqués :')
         with st.expander("Options de téléchargement des filtres", expanded=False):
-            if 'filtered_df' in st.session_state:
-                filtered_json = st.session_state.filtered_df.to_json(orient='records', indent=2)
-                filtered_csv = st.session_state.filtered_df.to_csv(index=False).encode('utf-8')
+            if st.session_state.get('filtered_df') is not None:
+                download_buttons(st.session_state.filtered_df.frame, 'filtered_data', key='download_filtered', indent=2)
 
-                try:
-                    buffer = io.BytesIO()
-                    # Convertir explicitement les colonnes en types compatibles
-                    for col in st.session_state.filtered_df.columns:
-                        if st.session_state.filtered_df[col].dtype == 'object':
-                            st.session_state.filtered_df[col] = st.session_state.filtered_df[col].astype('string')
-
-                    st.session_state.filtered_df.to_parquet(buffer, index=False)
-                    filtered_parquet = buffer.getvalue()
-
-                    st.download_button(
-                        label="Télécharger en JSON",
-                        data=filtered_json,
-                        file_name="filtered_data.json",
-                        mime="application/json"
-                    )
-                    st.download_button(
-                        label="Télécharger en CSV",
-                        data=filtered_csv,
-                        file_name="filtered_data.csv",
-                        mime="text/csv"
-                    )
-                    st.download_button(
-                        label="Télécharger en Parquet",
-                        data=filtered_parquet,
-                        file_name="filtered_data.parquet",
-                        mime="application/octet-stream"
-                    )
-                except Exception as e:
-                    st.error(f"Erreur lors de la conversion en Parquet: {e}")
+perf_panel(recorder)
+
+# Suivre les tâches de fond en cours (chargement, filtrage, export)
+poll_jobs()
@@ -1,29 +1,62 @@
 import streamlit as st
-import pandas as pd
-import json
-import io
-
-# Fonction pour lire les fichiers
-def load_file(file):
-    if file.name.endswith('.json'):
-        data = json.load(file)
-        return pd.DataFrame(data)
-    elif file.name.endswith('.csv'):
-        return pd.read_csv(file)
-    elif file.name.endswith('.parquet'):
-        return pd.read_parquet(file)
-    else:
-        st.error("Format de fichier non pris en charge!")
-        return None
+
+from components.downloads import download_buttons
+from components.jobs import job_result, load_dataset, poll_jobs, start_job
+from components.memory import show_memory_report
+from components.perf import perf_panel
+from components.stats import show_column_hints, show_profile
+from components.viewer import show_dataframe
+from engine.aggregate import AGGREGATIONS, aggregate, aggregation_key, check_aggregation
+from engine.backends import BACKEND_LABELS, available_backends, backend_for
+from engine.diff import diff_frames
+from engine.filters import FilterChainCache, result_key
+from engine.indexes import indexes_for
+from engine.ingestion import dataset_handle, dataset_key, dataset_parquet_scan, dataset_source, file_format
+from engine.jobs import BACKGROUND_MIN_ROWS
+from engine.perf import start_run
+from engine.parquet import parquet_columns, parquet_statistics
+from engine.search import text_search_for
+from engine.stats import stats_for
+from engine.store import share_frame
+
+# Mesures de durée et de mémoire de ce rerun (voir engine.perf)
+recorder = start_run('view')
 
 # Téléchargement du fichier
 uploaded_file = st.file_uploader("Choisissez un fichier JSON, CSV ou Parquet", type=["json", "csv", "parquet"])
+streaming = st.checkbox("Lecture par morceaux (fichiers volumineux)", key='streaming_load')
+compact = st.checkbox("Optimiser la mémoire (types compacts)", key='compact_load')
+
+# Lecture partielle des fichiers Parquet : seules les colonnes choisies sont lues, et les
+# filtres avancés peuvent être appliqués pendant la lecture (groupes de lignes sautés)
+columns = None
+pushdown = None
+if uploaded_file is not None and file_format(uploaded_file) == 'parquet':
+    with st.expander("Lecture Parquet partielle", expanded=False):
+        all_columns = parquet_columns(uploaded_file)
+        selected = st.multiselect("Colonnes à lire", all_columns, default=all_columns, key='parquet_columns')
+        if selected and len(selected) < len(all_columns):
+            columns = selected
+        if st.checkbox("Appliquer les filtres avancés pendant la lecture", key='parquet_pushdown'):
+            pushdown = st.session_state.get('advanced_filters') or None
 
 if uploaded_file is not None:
-    df = load_file(uploaded_file)
+    # Un fichier volumineux est chargé en tâche de fond (voir components.jobs)
+    key = dataset_key(uploaded_file, streaming, compact, columns, pushdown)
+    try:
+        df = load_dataset(uploaded_file, key, 'view_load', streaming=streaming, compact=compact,
+                          columns=columns, filters=pushdown)
+    except ValueError as e:
+        st.error(str(e))
+        df = None
     if df is not None:
         st.write('### DataFrame original :')
-        st.dataframe(df)
+        show_dataframe(df, key='view_original')
+        show_memory_report(key)
+        scan = dataset_parquet_scan(key)
+        if scan is not None:
+            st.caption(f"Parquet : {scan['bytes_read'] / 1024 ** 2:.1f} Mo lus sur {scan['bytes_total'] / 1024 ** 2:.1f} Mo "
+                       f"({scan['row_groups_read']}/{scan['row_groups_total']} groupes de lignes)")
 
         # Initialisation des filtres
         if 'simple_filter' not in st.session_state:
@@ -34,36 +67,42 @@ if uploaded_file is not None:
             st.session_state.filtered_df1 = None
         if 'filtered_df2' not in st.session_state:
             st.session_state.filtered_df2 = None
+        if 'filter_cache' not in st.session_state:
+            st.session_state.filter_cache = FilterChainCache()
+
+        # La session ne garde que des poignées vers le magasin partagé (voir engine.store) :
+        # le dataset et les résultats filtrés ne sont stockés qu'une fois pour toutes les sessions
+        if getattr(st.session_state.get('view_dataset'), 'key', None) != key:
+            st.session_state.view_dataset = dataset_handle(key)
+
+        # Statistiques des colonnes, calculées une fois par version du dataset. Pour un Parquet
+        # lu sans filtre, min/max et valeurs manquantes viennent du pied de page du fichier.
+        known = parquet_statistics(uploaded_file) if file_format(uploaded_file) == 'parquet' and pushdown is None else None
+        stats = stats_for(key, df, known)
+        show_profile(stats, key='view_profile')
+
+        # Index optionnels, construits à la première recherche sur chaque colonne
+        use_indexes = st.checkbox('Indexer les colonnes recherchées (gros datasets)', key='use_indexes')
+        indexes = indexes_for(key, df) if use_indexes else None
+        # Colonnes converties en texte une seule fois pour les recherches 'contains'
+        text = text_search_for(key, df)
 
-        # Fonction pour convertir les valeurs des filtres
-        def convert_value(value, dtype):
-            if dtype == 'int64':
-                return int(value)
-            elif dtype == 'float64':
-                return float(value)
-            return value
-
-        # Fonction pour appliquer les filtres avancés
-        def apply_advanced_filters(df, filters):
-            for column_name, condition, value in filters:
-                col_dtype = df[column_name].dtype
-                if condition == 'equals':
-                    value = convert_value(value, col_dtype)
-                    df = df[df[column_name] == value]
-                elif condition == 'contains':
-                    df = df[df[column_name].astype(str).str.contains(value, na=False)]
-                elif condition == 'greater_than':
-                    value = convert_value(value, col_dtype)
-                    df = df[df[column_name] > value]
-                elif condition == 'less_than':
-                    value = convert_value(value, col_dtype)
-                    df = df[df[column_name] < value]
-                elif condition == 'between':
-                    min_value, max_value = value
-                    min_value = convert_value(min_value, col_dtype)
-                    max_value = convert_value(max_value, col_dtype)
-                    df = df[df[column_name].between(min_value, max_value)]
-            return df
+        # Moteur de requête : pandas en mémoire, ou évaluation directe sur le fichier du magasin
+        source, source_format = dataset_source(key)
+        backend_name = st.selectbox('Moteur de requête', available_backends(source_format),
+                                    format_func=BACKEND_LABELS.get, key='query_backend')
+        backend = backend_for(backend_name, df, source, source_format, indexes, text, st.session_state.filter_cache)
+
+        # Fonction pour lancer le filtrage (voir engine.filters et engine.backends) sous un nom.
+        # Les résultats intermédiaires sont gardés entre les reruns, et le résultat est une
+        # poignée partagée entre sessions. Un grand DataFrame est filtré en tâche de fond :
+        # job_result(nom) renvoie la poignée une fois le filtrage terminé.
+        def start_filter(name, filters):
+            filters = list(filters)
+            filter_key = result_key(key, filters)
+            start_job(name, ('filter', filter_key),
+                      lambda progress: share_frame(filter_key, lambda: backend.query(filters, progress=progress)),
+                      background=len(df) >= BACKGROUND_MIN_ROWS)
 
         # Recherche simple
         st.write('### Recherche simple :')
@@ -71,33 +110,46 @@ if uploaded_file is not None:
         simple_value = st.text_input('Valeur', key='simple_filter_value')
         if st.button('Appliquer filtre simple'):
             st.session_state.simple_filter = (simple_column, simple_value)
-            st.experimental_rerun()
+            st.rerun()
 
         if st.session_state.simple_filter:
             column_name, value = st.session_state.simple_filter
-            filtered_df = df[df[column_name].astype(str).str.contains(value, na=False)]
-            st.write('### DataFrame après filtrage simple :')
-            st.dataframe(filtered_df)
+            start_filter('view_simple', [(column_name, 'contains', value)])
+            filtered = job_result('view_simple', 'Filtrage en cours')
+            if filtered is not None:
+                st.write('### DataFrame après filtrage simple :')
+                show_dataframe(filtered.frame, key='view_simple')
 
-            # Sauvegarder le DataFrame filtré simple dans session_state
-            st.session_state.filtered_df = filtered_df
+                # Sauvegarder la poignée du DataFrame filtré simple dans session_state (clé
+                # partagée avec la page de modification)
+                st.session_state.filtered_df = filtered
 
         # Recherche avancée
         st.write('### Recherche avancée :')
+        # Colonne et condition hors du formulaire : les indications suivent la colonne choisie
+        column_name = st.selectbox('Colonne', df.columns, key='advanced_filter_column')
+        condition = st.selectbox('Condition', ['equals', 'contains', 'greater_than', 'less_than', 'between'], key='advanced_filter_condition')
+        column_info = stats.column(column_name)
+        show_column_hints(column_info)
+        # Toutes les valeurs de la colonne sont connues : elles sont proposées pour 'equals'
+        choices = [value for value, _ in column_info['top']]
+        suggest = condition == 'equals' and choices and column_info['distinct_exact'] and column_info['distinct'] <= len(choices)
         with st.form(key='advanced_filter_form'):
-            column_name = st.selectbox('Colonne', df.columns, key='advanced_filter_column')
-            condition = st.selectbox('Condition', ['equals', 'contains', 'greater_than', 'less_than', 'between'], key='advanced_filter_condition')
             if condition == 'between':
-                value1 = st.text_input('Valeur minimale', key='advanced_filter_value1')
-                value2 = st.text_input('Valeur maximale', key='advanced_filter_value2')
+                low = '' if column_info['min'] is None else str(column_info['min'])
+                high = '' if column_info['max'] is None else str(column_info['max'])
+                value1 = st.text_input('Valeur minimale', key='advanced_filter_value1', placeholder=low)
+                value2 = st.text_input('Valeur maximale', key='advanced_filter_value2', placeholder=high)
                 value = (value1, value2)
+            elif suggest:
+                value = st.selectbox('Valeur', choices, format_func=str, key='advanced_filter_choice')
             else:
                 value = st.text_input('Valeur', key='advanced_filter_value')
             add_filter = st.form_submit_button('Ajouter le filtre')
 
         if add_filter:
             st.session_state.advanced_filters.append((column_name, condition, value))
-            st.experimental_rerun()
+            st.rerun()
 
         # Afficher les filtres avancés en attente
         st.write('### Filtres avancés en attente :')
@@ -112,16 +164,59 @@ if uploaded_file is not None:
             with col2:
                 if st.button('Supprimer', key=f'delete_advanced_filter_{i}'):
                     st.session_state.advanced_filters.pop(i)
-                    st.experimental_rerun()
+                    st.rerun()
 
         # Appliquer les filtres avancés et afficher le DataFrame filtré
         if st.button('Appliquer les filtres avancés'):
-            filtered_df = apply_advanced_filters(df, st.session_state.advanced_filters)
+            start_filter('view_advanced', st.session_state.advanced_filters)
+        filtered = job_result('view_advanced', 'Filtrage en cours')
+        if filtered is not None:
+            # Sauvegarder la poignée du DataFrame filtré dans session_state
+            st.session_state.filtered_df = filtered
+            st.session_state.advanced_filtered_df = filtered
+
+        # Le résultat reste affiché pour pouvoir le parcourir page par page
+        if st.session_state.get('advanced_filtered_df') is not None:
             st.write('### DataFrame après filtrage avancé :')
-            st.dataframe(filtered_df)
+            show_dataframe(st.session_state.advanced_filtered_df.frame, key='view_advanced')
 
-            # Sauvegarder le DataFrame filtré dans session_state
-            st.session_state.filtered_df = filtered_df
+        # Agrégation du résultat des filtres avancés (ou du dataset entier) : seul le petit
+        # résultat est affiché et téléchargé. Il est partagé sous une clé (filtres, regroupement).
+        st.write('### Agrégation :')
+        filtered = st.session_state.get('advanced_filtered_df')
+        if filtered is not None and filtered.key.startswith(f'{key}|'):
+            # La poignée est liée à la création de la tâche, qui peut tourner après la fin du script
+            source_key, source_frame = filtered.key, lambda handle=filtered: handle.frame
+            st.caption('Source : résultat des filtres avancés')
+        else:
+            source_key, source_frame = key, lambda: df
+            st.caption('Source : dataset complet')
+        group_by = st.multiselect('Grouper par', df.columns, key='aggregate_group_by')
+        aggregated_columns = st.multiselect('Colonnes à agréger', df.columns, key='aggregate_columns')
+        functions = st.multiselect('Fonctions', list(AGGREGATIONS), default=['sum'], format_func=AGGREGATIONS.get,
+                                   key='aggregate_functions')
+        quantile = 0.5
+        if 'quantile' in functions:
+            quantile = st.number_input('Quantile', min_value=0.0, max_value=1.0, value=0.5, step=0.05, key='aggregate_quantile')
+        if st.button('Agréger'):
+            aggregations = [(column_name, func) for column_name in aggregated_columns for func in functions]
+            try:
+                check_aggregation(df, group_by, aggregations, quantile)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                frame_key = aggregation_key(source_key, group_by, aggregations, quantile)
+                start_job('view_aggregate', ('aggregate', frame_key),
+                          lambda progress: share_frame(frame_key, lambda: aggregate(source_frame(), group_by, aggregations, quantile)),
+                          background=len(df) >= BACKGROUND_MIN_ROWS)
+        aggregated = job_result('view_aggregate', 'Agrégation en cours')
+        if aggregated is not None:
+            st.session_state.aggregated_df = aggregated
+        if st.session_state.get('aggregated_df') is not None:
+            st.write("### Résultat de l'agrégation :")
+            show_dataframe(st.session_state.aggregated_df.frame, key='view_aggregated')
+            download_buttons(st.session_state.aggregated_df.frame, 'aggregated_data', key='download_aggregated',
+                             label_suffix=' (agrégation)', indent=2)
 
         # Options pour télécharger les filtres appliqués
         st.write('### Télécharger les filtres appliqués :')
@@ -140,70 +235,12 @@ if uploaded_file is not None:
             st.markdown('<div class="small-button">', unsafe_allow_html=True)
 
             if 'filtered_df1' in st.session_state and st.session_state.filtered_df1 is not None:
-                filtered_json1 = st.session_state.filtered_df1.to_json(orient='records', indent=2)
-                filtered_csv1 = st.session_state.filtered_df1.to_csv(index=False).encode('utf-8')
-
-                try:
-                    buffer1 = io.BytesIO()
-                    for col in st.session_state.filtered_df1.columns:
-                        if st.session_state.filtered_df1[col].dtype == 'object':
-                            st.session_state.filtered_df1[col] = st.session_state.filtered_df1[col].astype('string')
-                    st.session_state.filtered_df1.to_parquet(buffer1, index=False)
-                    filtered_parquet1 = buffer1.getvalue()
-
-                    st.download_button(
-                        label="Télécharger en JSON (Filtres 1)",
-                        data=filtered_json1,
-                        file_name="filtered_data1.json",
-                        mime="application/json"
-                    )
-                    st.download_button(
-                        label="Télécharger en CSV (Filtres 1)",
-                        data=filtered_csv1,
-                        file_name="filtered_data1.csv",
-                        mime="text/csv"
-                    )
-                    st.download_button(
-                        label="Télécharger en Parquet (Filtres 1)",
-                        data=filtered_parquet1,
-                        file_name="filtered_data1.parquet",
-                        mime="application/octet-stream"
-                    )
-                except Exception as e:
-                    st.error(f"Erreur lors de la conversion en Parquet: {e}")
+                download_buttons(st.session_state.filtered_df1.frame, 'filtered_data1', key='download_filtered1',
+                                 label_suffix=' (Filtres 1)', indent=2)
 
             if 'filtered_df2' in st.session_state and st.session_state.filtered_df2 is not None:
-                filtered_json2 = st.session_state.filtered_df2.to_json(orient='records', indent=2)
-                filtered_csv2 = st.session_state.filtered_df2.to_csv(index=False).encode('utf-8')
-
-                try:
-                    buffer2 = io.BytesIO()
-                    for col in st.session_state.filtered_df2.columns:
-                        if st.session_state.filtered_df2[col].dtype == 'object':
-                            st.session_state.filtered_df2[col] = st.session_state.filtered_df2[col].astype('string')
-                    st.session_state.filtered_df2.to_parquet(buffer2, index=False)
-                    filtered_parquet2 = buffer2.getvalue()
-
-                    st.download_button(
-                        label="Télécharger en JSON (Filtres 2)",
-                        data=filtered_json2,
-                        file_name="filtered_data2.json",
-                        mime="application/json"
-                    )
-                    st.download_button(
-                        label="Télécharger en CSV (Filtres 2)",
-                        data=filtered_csv2,
-                        file_name="filtered_data2.csv",
-                        mime="text/csv"
-                    )
-                    st.download_button(
-                        label="Télécharger en Parquet (Filtres 2)",
-                        data=filtered_parquet2,
-                        file_name="filtered_data2.parquet",
-                        mime="application/octet-stream"
-                    )
-                except Exception as e:
-                    st.error(f"Erreur lors de la conversion en Parquet: {e}")
+                download_buttons(st.session_state.filtered_df2.frame, 'filtered_data2', key='download_filtered2',
+                                 label_suffix=' (Filtres 2)', indent=2)
 
             st.markdown('</div>', unsafe_allow_html=True)
 
@@ -212,5 +249,37 @@ if uploaded_file is not None:
         col1, col2 = st.columns(2)
         with col1:
             if st.button('Filtrer et stocker les données comme "Filtres 1"'):
-                st.session
+                start_filter('view_filtered1', st.session_state.advanced_filters)
+        with col2:
+            if st.button('Filtrer et stocker les données comme "Filtres 2"'):
+                start_filter('view_filtered2', st.session_state.advanced_filters)
+        for slot, name in (('filtered_df1', 'view_filtered1'), ('filtered_df2', 'view_filtered2')):
+            stored = job_result(name, 'Filtrage en cours')
+            if stored is not None:
+                st.session_state[slot] = stored
+                st.rerun()
+
+        # Comparer les deux ensembles filtrés : lignes associées par leur index (les lignes
+        # du dataset d'origine) ou par des colonnes clés
+        first, second = st.session_state.filtered_df1, st.session_state.filtered_df2
+        if first is not None and second is not None:
+            st.write('### Comparer "Filtres 1" et "Filtres 2" :')
+            key_columns = st.multiselect('Colonnes clés (par défaut : lignes du dataset d\'origine)', df.columns, key='diff_key_columns')
+            if st.button('Comparer les filtres'):
+                start_job('view_diff', ('diff', first.key, second.key, tuple(key_columns)),
+                          lambda progress: diff_frames(first.frame, second.frame, key_columns),
+                          background=max(len(first.frame), len(second.frame)) >= BACKGROUND_MIN_ROWS)
+            diff = job_result('view_diff', 'Comparaison en cours')
+            if diff is not None:
+                st.session_state.view_diff = diff
+            if st.session_state.get('view_diff') is not None:
+                diff = st.session_state.view_diff
+                st.write(f"Filtres 1 → Filtres 2 : {diff.summary()}")
+                if len(diff.changes):
+                    show_dataframe(diff.changes, key='view_diff')
+                    download_buttons(diff.changes, 'diff_filtres', key='download_diff', label_suffix=' (différences)', indent=2)
+
+perf_panel(recorder)
 
+# Suivre les tâches de fond en cours (chargement, filtrage, export)
+poll_jobs()